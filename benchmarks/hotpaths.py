@@ -0,0 +1,231 @@
+import argparse
+import atexit
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Todo lo que persiste (memo de sentimiento, modelos) va a un directorio temporal
+# para no ensuciar .data ni medir cachés calientes de corridas anteriores.
+_TMP = tempfile.mkdtemp(prefix="tikpred-bench-")
+atexit.register(shutil.rmtree, _TMP, True)
+os.environ.setdefault("TIKPRED_DATA_DIR", _TMP)
+os.environ.setdefault("TIKPRED_PREWARM", "0")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+
+from pybackend.services import sentiment
+from pybackend.services.memo import ContentMemo
+from pybackend.services.metrics import compute_metrics_frames, compute_metrics_matrix
+from pybackend.services.ml import aplicar_kmeans, forecast_batch, forecast_next_price
+from pybackend.services.similarity import extract_features, find_similar_stocks, normalize_vectors
+
+# -----------------------------------------------------------------------------
+# Microbenchmarks offline de los caminos de cómputo sobre datos sintéticos con
+# semilla fija. Mide tiempo (mejor de N repeticiones) y pico de memoria
+# (tracemalloc, en una corrida aparte) por función y escala, y compara contra
+# una línea base guardada para marcar regresiones.
+#
+#   python benchmarks/hotpaths.py                       # 10, 1k y 50k símbolos
+#   python benchmarks/hotpaths.py --scales 10 1000 --only forecast kmeans
+#   python benchmarks/hotpaths.py --save-baseline       # guarda la línea base
+#   python benchmarks/hotpaths.py --baseline            # compara (exit 1 si empeora)
+# -----------------------------------------------------------------------------
+
+SEED = 1234
+BARS = 60
+DEFAULT_SCALES = [10, 1000, 50000]
+_DEFAULT_BASELINE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".data", "bench", "baseline.json"))
+
+_POS = ["beats", "surge", "record", "upgrade", "growth", "strong", "launches", "partnership"]
+_NEG = ["misses", "plunge", "downgrade", "lawsuit", "weak", "cuts", "recall", "probe"]
+_NEUTRAL = ["shares", "quarter", "market", "investors", "report", "guidance", "sector", "update"]
+
+def synthetic_closes(n: int, bars: int = BARS, seed: int = SEED):
+    """Matriz (bars × n) de cierres con caminata geométrica y volatilidad por símbolo."""
+    rng = np.random.default_rng(seed)
+    vol = rng.uniform(0.005, 0.04, n)
+    drift = rng.normal(0.0005, 0.001, n)
+    rets = rng.normal(drift, vol, (bars, n))
+    closes = rng.uniform(10, 500, n) * np.exp(np.cumsum(rets, axis=0))
+    volumes = rng.lognormal(13, 1, (bars, n))
+    return closes, volumes
+
+def synthetic_frames(n: int, seed: int = SEED) -> Dict[str, Any]:
+    closes, volumes = synthetic_closes(n, seed=seed)
+    idx = pd.DatetimeIndex(pd.bdate_range("2024-01-02", periods=BARS), name="Date")
+    return {f"SYM{i}": pd.DataFrame({"Close": closes[:, i], "Volume": volumes[:, i]}, index=idx) for i in range(n)}
+
+def synthetic_headlines(n: int, seed: int = SEED) -> List[str]:
+    rng = np.random.default_rng(seed)
+    words = np.array(_POS + _NEG + _NEUTRAL * 3)
+    picks = rng.integers(0, len(words), (n, 7))
+    return [f"SYM{i} " + " ".join(words[row]) + f" {i}" for i, row in enumerate(picks)]
+
+def synthetic_pool(n: int, seed: int = SEED) -> List[Dict[str, Any]]:
+    """Pool con la forma de recommend_for_symbol (info, metrics, sentiment)."""
+    rng = np.random.default_rng(seed)
+    closes, _ = synthetic_closes(n, seed=seed)
+    rets = closes[1:] / closes[:-1] - 1.0
+    return [
+        {
+            "symbol": f"SYM{i}",
+            "info": {"trailingPE": float(rng.uniform(5, 60)), "beta": float(rng.uniform(0.3, 2.0))},
+            "metrics": {"returns": float(rets[:, i].mean()), "volatility": float(rets[-30:, i].std(ddof=1))},
+            "sentiment": float(rng.uniform(-1, 1)),
+        }
+        for i in range(n)
+    ]
+
+def _metric_rows(n: int) -> List[Dict[str, Any]]:
+    closes, volumes = synthetic_closes(n)
+    return compute_metrics_matrix([f"SYM{i}" for i in range(n)], closes, volumes)
+
+# Un único memo para todas las repeticiones: cada ContentMemo queda registrado
+# en cache._CACHES, así que crear uno por repetición acumularía cachés.
+_BENCH_MEMO = ContentMemo("bench_memo", path=os.path.join(_TMP, "bench_memo.sqlite"))
+
+def _fresh_memo() -> None:
+    # Memo vacío por repetición: se mide el puntaje en frío, no el hit del memo.
+    _BENCH_MEMO.clear()
+    sentiment._MEMO = _BENCH_MEMO
+
+# nombre -> (setup(n) -> args, fn(*args), antes de cada repetición o None)
+Case = Tuple[Callable[[int], tuple], Callable[..., Any], Optional[Callable[[], None]]]
+
+CASES: Dict[str, Case] = {
+    "kmeans": (
+        lambda n: (_metric_rows(n),),
+        lambda rows: aplicar_kmeans(rows, 3, warm_start=False),
+        None,
+    ),
+    "forecast": (
+        lambda n: ([list(col) for col in synthetic_closes(n)[0].T],),
+        lambda series: [forecast_next_price(s) for s in series],
+        None,
+    ),
+    "forecast_batch": (
+        lambda n: (synthetic_closes(n)[0].T.copy(),),
+        forecast_batch,
+        None,
+    ),
+    "similar": (
+        lambda n: ("SYM0", synthetic_pool(n)),
+        lambda target, pool: find_similar_stocks(target, pool, 5),
+        None,
+    ),
+    "normalize": (
+        lambda n: ([extract_features(p) for p in synthetic_pool(n)],),
+        normalize_vectors,
+        None,
+    ),
+    "sentiment": (
+        lambda n: (synthetic_headlines(n),),
+        sentiment.sentiment_score,
+        _fresh_memo,
+    ),
+    "metrics_matrix": (
+        lambda n: ([f"SYM{i}" for i in range(n)],) + synthetic_closes(n),
+        compute_metrics_matrix,
+        None,
+    ),
+    "metrics_frames": (
+        lambda n: ([f"SYM{i}" for i in range(n)], synthetic_frames(n)),
+        compute_metrics_frames,
+        None,
+    ),
+}
+
+def measure(case: Case, n: int, repeat: int) -> Dict[str, float]:
+    setup, fn, before = case
+    args = setup(n)
+    if before is None:
+        fn(*args)  # calienta imports perezosos y cachés de módulo (lru_cache, etc.)
+    times = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+    if before is not None:
+        before()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "median": statistics.median(times), "peak_bytes": float(peak)}
+
+def run(names: List[str], scales: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in names:
+        for n in scales:
+            key = f"{name}@{n}"
+            results[key] = measure(CASES[name], n, repeat)
+            r = results[key]
+            print(f"{key:<24} {r['seconds'] * 1000:>11.2f} ms  {r['peak_bytes'] / 1e6:>9.2f} MB", flush=True)
+    return results
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Claves que empeoraron más de `tolerance` (fracción) en tiempo o memoria."""
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for field in ("seconds", "peak_bytes"):
+            # Pisos para que el ruido en mediciones minúsculas no cuente como regresión.
+            floor = 1e-3 if field == "seconds" else 64 * 1024
+            if r[field] > max(base[field], floor) * (1 + tolerance):
+                regressions.append(f"{key} {field}: {base[field]:.6g} -> {r[field]:.6g} ({r[field] / max(base[field], 1e-12):.2f}x)")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Microbenchmarks offline de los caminos de cómputo.")
+    p.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    p.add_argument("--only", nargs="+", choices=sorted(CASES), help="sólo estos casos")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--baseline", nargs="?", const=_DEFAULT_BASELINE, help="comparar contra esta línea base")
+    p.add_argument("--save-baseline", nargs="?", const=_DEFAULT_BASELINE, help="guardar resultados como línea base")
+    p.add_argument("--tolerance", type=float, default=0.25, help="empeoramiento tolerado (0.25 = 25%%)")
+    p.add_argument("--json", help="escribir los resultados en este archivo")
+    args = p.parse_args(argv)
+
+    results = run(args.only or list(CASES), args.scales, max(1, args.repeat))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline), exist_ok=True)
+        saved = {}
+        if os.path.exists(args.save_baseline):
+            with open(args.save_baseline, "r", encoding="utf-8") as fh:
+                saved = json.load(fh)
+        saved.update(results)
+        with open(args.save_baseline, "w", encoding="utf-8") as fh:
+            json.dump(saved, fh, indent=2, sort_keys=True)
+        print(f"Línea base guardada en {args.save_baseline}")
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            print(f"[ERROR] No existe la línea base {args.baseline}")
+            return 2
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for line in regressions:
+            print(f"[REGRESIÓN] {line}")
+        if regressions:
+            return 1
+        print("Sin regresiones respecto de la línea base.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# -----------------------------------------------------------------------------
+# Generador de carga para /quotes y /api/analyze-market. Por defecto levanta la
+# app en el mismo proceso (httpx + ASGITransport) con un proveedor de datos
+# sustituto (sintético o replay de capturas) y latencia inyectada; con --url
+# apunta a un servidor ya levantado (arrancarlo con TIKPRED_DATA_PROVIDER).
+# Reporta throughput, p50/p95/p99 por endpoint y llamadas upstream por nivel de
+# concurrencia, para dimensionar workers antes de cada deploy.
+#
+#   python benchmarks/loadgen.py --concurrency 1 8 32 --duration 10
+#   python benchmarks/loadgen.py --mix quotes=1 --skew 1.2 --latency history=0.3,info=0.1,news=0.4
+#   python benchmarks/loadgen.py --replay .data/captures --cold
+#   python benchmarks/loadgen.py --url http://127.0.0.1:8000 --concurrency 16
+# -----------------------------------------------------------------------------
+
+os.environ.setdefault("TIKPRED_PREWARM", "0")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+DEFAULT_SYMBOLS = [
+    "AAPL", "MSFT", "NVDA", "META", "GOOG", "GOOGL", "NFLX", "DIS", "TTWO", "T",
+    "AMZN", "TSLA", "NKE", "HD", "SBUX", "JPM", "BAC", "V", "MA", "GS",
+    "UNH", "JNJ", "PFE", "MRK", "ABBV", "XOM", "CVX", "COP", "SLB", "EOG",
+]
+
+def _parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        name, _, w = part.partition("=")
+        mix.append((name.strip(), float(w or 1)))
+    return mix
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(q / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class Workload:
+    def __init__(self, symbols: List[str], mix: List[Tuple[str, float]], analyze_size: int, skew: float, seed: int):
+        self.symbols = symbols
+        self.names = [m[0] for m in mix]
+        self.weights = [m[1] for m in mix]
+        self.analyze_size = min(analyze_size, len(symbols))
+        self.rng = random.Random(seed)
+        # Zipf opcional: unos pocos símbolos "calientes" concentran la mayoría de los pedidos.
+        self.sym_weights = [1.0 / (i + 1) ** skew for i in range(len(symbols))] if skew > 0 else None
+
+    def next(self) -> Tuple[str, str, str, Optional[Dict[str, Any]]]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        if name == "quotes":
+            sym = self.rng.choices(self.symbols, self.sym_weights)[0] if self.sym_weights else self.rng.choice(self.symbols)
+            return name, "GET", f"/quotes?symbol={sym}", None
+        if name == "analyze":
+            syms = self.rng.sample(self.symbols, self.analyze_size)
+            return name, "POST", "/api/analyze-market", {"symbols": syms}
+        if name == "recommend":
+            syms = self.rng.sample(self.symbols, self.analyze_size)
+            return name, "POST", "/api/recommend", {"symbols": syms}
+        raise ValueError(f"Endpoint desconocido en --mix: {name}")
+
+async def _worker(client, workload: Workload, stop_at: float, budget: List[int], out: Dict[str, List[float]], errors: Counter):
+    while time.monotonic() < stop_at:
+        if budget[0] <= 0:
+            return
+        budget[0] -= 1
+        name, method, path, body = workload.next()
+        t0 = time.perf_counter()
+        try:
+            resp = await client.request(method, path, json=body)
+            ok = resp.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - t0
+        if ok:
+            out.setdefault(name, []).append(elapsed)
+        else:
+            errors[name] += 1
+
+async def run_level(client, workload: Workload, concurrency: int, duration: float, max_requests: Optional[int]) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {}
+    errors: Counter = Counter()
+    budget = [max_requests if max_requests else 1 << 62]
+    started = time.monotonic()
+    await asyncio.gather(*[
+        _worker(client, workload, started + duration, budget, latencies, errors) for _ in range(concurrency)
+    ])
+    wall = time.monotonic() - started
+    report: Dict[str, Any] = {"concurrency": concurrency, "seconds": wall, "endpoints": {}}
+    total = 0
+    for name in sorted(set(latencies) | set(errors)):
+        lat = sorted(latencies.get(name, []))
+        total += len(lat)
+        report["endpoints"][name] = {
+            "ok": len(lat),
+            "errors": errors[name],
+            "rps": len(lat) / wall if wall > 0 else 0.0,
+            "p50": percentile(lat, 50),
+            "p95": percentile(lat, 95),
+            "p99": percentile(lat, 99),
+            "max": lat[-1] if lat else None,
+        }
+    report["rps"] = total / wall if wall > 0 else 0.0
+    return report
+
+def _reset_caches() -> None:
+    from pybackend.services import finance, sentiment
+    for cache in (finance._HIST_CACHE, finance._INFO_CACHE, sentiment._HEADLINE_CACHE):
+        cache.clear()
+
+def _ms(v: Optional[float]) -> str:
+    return "-" if v is None else f"{v * 1000:.1f}"
+
+def print_report(rep: Dict[str, Any]) -> None:
+    print(f"\n== concurrencia {rep['concurrency']}: {rep['rps']:.1f} req/s en {rep['seconds']:.1f}s")
+    print(f"   {'endpoint':<10} {'ok':>6} {'err':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, e in rep["endpoints"].items():
+        print(f"   {name:<10} {e['ok']:>6} {e['errors']:>5} {e['rps']:>8.1f} {_ms(e['p50']):>9} "
+              f"{_ms(e['p95']):>9} {_ms(e['p99']):>9} {_ms(e['max']):>9}")
+    if rep.get("upstream") is not None:
+        calls = ", ".join(f"{k}={v}" for k, v in sorted(rep["upstream"].items())) or "ninguna"
+        print(f"   llamadas upstream: {calls}")
+
+async def main_async(args) -> List[Dict[str, Any]]:
+    import httpx
+    symbols = DEFAULT_SYMBOLS
+    if args.universe:
+        from pybackend.services.catalog import load_universe
+        symbols = load_universe(args.universe)
+    elif args.symbols:
+        symbols = args.symbols
+    workload = Workload(symbols, _parse_mix(args.mix), args.analyze_size, args.skew, args.seed)
+    reports = []
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            for c in args.concurrency:
+                rep = await run_level(client, workload, c, args.duration, args.requests)
+                rep["upstream"] = None  # no visible desde afuera del proceso
+                print_report(rep)
+                reports.append(rep)
+        return reports
+
+    from pybackend.services import providers
+    from pybackend.services.providers import ReplayProvider, SyntheticProvider, _parse_latency
+    latency = _parse_latency(args.latency)
+    provider = ReplayProvider(args.replay, latency=latency) if args.replay else SyntheticProvider(latency=latency)
+    providers.set_provider(provider)
+    from pybackend import app as appmod
+    if appmod.app is None:
+        raise SystemExit("FastAPI no está instalado: usar --url contra un servidor.")
+    transport = httpx.ASGITransport(app=appmod.app)
+    async with appmod.app.router.lifespan_context(appmod.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadgen", timeout=args.timeout) as client:
+            for c in args.concurrency:
+                if args.cold:
+                    _reset_caches()
+                before = Counter(provider.calls)
+                rep = await run_level(client, workload, c, args.duration, args.requests)
+                rep["upstream"] = dict(Counter(provider.calls) - before)
+                print_report(rep)
+                reports.append(rep)
+    return reports
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Carga sobre /quotes y /api/analyze-market con datos sustitutos.")
+    p.add_argument("--url", help="servidor ya levantado; sin esto la app corre en este proceso")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    p.add_argument("--duration", type=float, default=10.0, help="segundos por nivel de concurrencia")
+    p.add_argument("--requests", type=int, help="tope de requests por nivel")
+    p.add_argument("--mix", default="quotes=0.8,analyze=0.2", help="pesos por endpoint: quotes, analyze, recommend")
+    p.add_argument("--symbols", nargs="+", help="símbolos a usar (por defecto los del catálogo)")
+    p.add_argument("--universe", help="archivo de universo (txt/csv)")
+    p.add_argument("--analyze-size", type=int, default=10, help="símbolos por request de analyze/recommend")
+    p.add_argument("--skew", type=float, default=0.0, help="exponente Zipf para /quotes (0 = uniforme)")
+    p.add_argument("--latency", default="history=0.25,info=0.15,news=0.35", help="latencia inyectada del proveedor")
+    p.add_argument("--replay", help="directorio de capturas (RecordingProvider) en vez de datos sintéticos")
+    p.add_argument("--cold", action="store_true", help="vaciar cachés en memoria antes de cada nivel")
+    p.add_argument("--timeout", type=float, default=60.0)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--json", help="escribir el reporte en este archivo")
+    args = p.parse_args(argv)
+    if not args.url and "TIKPRED_DATA_DIR" not in os.environ:
+        # El almacén de precios y los modelos de una corrida no deben mezclarse con .data.
+        tmp = tempfile.mkdtemp(prefix="tikpred-load-")
+        atexit.register(shutil.rmtree, tmp, True)
+        os.environ["TIKPRED_DATA_DIR"] = tmp
+    reports = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(reports, fh, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import asyncio
 import json
 import os
 import sys
@@ -6,28 +7,41 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 def _try_import_fastapi():
     try:
-        from fastapi import FastAPI, Body
-        from fastapi.responses import JSONResponse
-        return FastAPI, Body, JSONResponse
+        from fastapi import FastAPI, Body, Request
+        from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+        return FastAPI, Body, Request, JSONResponse, PlainTextResponse, StreamingResponse
     except Exception:
-        return None, None, None
+        return None, None, None, None, None, None
 
-from pybackend.services.finance import compute_metrics, compute_metrics_bulk, get_historical, get_ticker_info
-from pybackend.services.ml import aplicar_kmeans, forecast_next_price
-from pybackend.services.sentiment import fetch_headlines, sentiment_score
+from pybackend.services import fanout, httpclient, models, prewarm, telemetry
+from pybackend.services.finance import (
+    compute_metrics, compute_metrics_async, compute_metrics_bulk,
+    get_historical, get_historical_async, get_ticker_info, get_ticker_info_async,
+    prefetch_history,
+)
+from pybackend.services.ml import forecast_next_price
+from pybackend.services.recommender import recommend_many
+from pybackend.services.similarity import SimilarityIndex
+from pybackend.services.sentiment import fetch_headlines, fetch_headlines_async, sentiment_score
 
-FastAPI, Body, JSONResponse = _try_import_fastapi()
+FastAPI, Body, Request, JSONResponse, PlainTextResponse, StreamingResponse = _try_import_fastapi()
 app = FastAPI() if FastAPI else None
 
-def quotes_payload(symbol: str) -> Dict[str, Any]:
-    metrics = compute_metrics(symbol)
-    info = get_ticker_info(symbol)
-    df = get_historical(symbol, period="70d")
+# Response fields left null when a source misses the request deadline.
+_QUOTE_FIELDS = {
+    "metrics": ["metrics"],
+    "info": ["info"],
+    "history": ["lastClose", "forecast"],
+    "headlines": ["headlines", "sentiment"],
+}
+
+def _quote_from(symbol: str, res: Dict[str, Any], missed: List[str]) -> Dict[str, Any]:
+    metrics, info, df = res["metrics"], res["info"], res["history"]
     last_close = None
     if df is not None and not df.empty:
         last_close = float(df["Close"].tail(1).values[0])
-    headlines = fetch_headlines(symbol)
-    sent = sentiment_score(headlines)
+    headlines = res["headlines"]
+    sent = sentiment_score(headlines) if headlines is not None else None
     closes = []
     if df is not None and not df.empty:
         closes = [float(x) for x in df["Close"].tail(60).tolist()]
@@ -40,21 +54,178 @@ def quotes_payload(symbol: str) -> Dict[str, Any]:
         "headlines": headlines,
         "sentiment": sent,
         "forecast": forecast,
+        "timedOut": fanout.timed_out_fields(missed, _QUOTE_FIELDS),
     }
 
+@telemetry.timed("app.quotes_payload")
+def quotes_payload(symbol: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+    res, missed = fanout.gather({
+        "metrics": (compute_metrics, symbol),
+        "info": (get_ticker_info, symbol),
+        "history": (get_historical, symbol, "70d"),
+        "headlines": (fetch_headlines, symbol),
+    }, deadline)
+    return _quote_from(symbol, res, missed)
+
+@telemetry.timed("app.quotes_payload_async")
+async def quotes_payload_async(symbol: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+    res, missed = await fanout.gather_async({
+        "metrics": compute_metrics_async(symbol),
+        "info": get_ticker_info_async(symbol),
+        "history": get_historical_async(symbol, "70d"),
+        "headlines": fetch_headlines_async(symbol),
+    }, deadline)
+    # Puntaje VADER, memo SQLite y pronóstico son CPU/E-S síncronos: fuera del loop.
+    return await asyncio.to_thread(_quote_from, symbol, res, missed)
+
 if app:
+    @app.on_event("startup")
+    async def _startup():
+        # yfinance is sync-only, so cache misses still run on the default executor;
+        # size it for many in-flight requests per worker.
+        from concurrent.futures import ThreadPoolExecutor
+        workers = int(os.environ.get("TIKPRED_IO_THREADS", "64"))
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+        prewarm.start()
+
+    @app.on_event("shutdown")
+    async def _shutdown():
+        await asyncio.to_thread(prewarm.stop)
+        await httpclient.aclose_all()
+
     @app.get("/quotes")
-    def quotes(symbol: str):
-        return JSONResponse(content=quotes_payload(symbol))
+    async def quotes(symbol: str):
+        return JSONResponse(content=await quotes_payload_async(symbol))
 
     @app.post("/api/analyze-market")
-    def analyze_market(payload: Dict[str, Any] = Body(...)):
+    async def analyze_market(payload: Dict[str, Any] = Body(...)):
+        symbols = payload.get("symbols") or []
+        data = await asyncio.to_thread(compute_metrics_bulk, symbols)
+        # Ajuste una vez por día sobre el universo configurado; cada request sólo predice.
+        clusters = await asyncio.to_thread(models.cluster, data, 3)
+        headers = {"X-Model-Version": clusters[0]["version"]} if clusters else None
+        return JSONResponse(content=clusters, headers=headers)
+
+    @app.post("/api/analyze-market/stream")
+    async def analyze_market_stream(request: Request, payload: Dict[str, Any] = Body(...), format: str = "ndjson"):
         symbols = payload.get("symbols") or []
-        data = compute_metrics_bulk(symbols)
-        clusters = aplicar_kmeans(data, n_clusters=3)
-        return JSONResponse(content=clusters)
+        sse = format == "sse"
+
+        async def body():
+            events = analyze_market_events(symbols, 3)
+            try:
+                async for ev in events:
+                    if await request.is_disconnected():
+                        break
+                    line = json.dumps(ev)
+                    yield f"event: {ev['type']}\ndata: {line}\n\n" if sse else line + "\n"
+            finally:
+                await events.aclose()
+
+        media = "text/event-stream" if sse else "application/x-ndjson"
+        return StreamingResponse(body(), media_type=media, headers={"Cache-Control": "no-cache"})
+
+    @app.post("/api/recommend")
+    async def recommend(payload: Dict[str, Any] = Body(...)):
+        try:
+            symbols = _recommend_symbols(payload.get("symbols"))
+            similar = _similar_k(payload.get("similar"))
+        except ValueError as e:
+            return JSONResponse(status_code=422, content={"detail": str(e)})
+        out = await asyncio.to_thread(recommend_payload, symbols, similar)
+        return JSONResponse(content=out)
+
+    @app.get("/metrics")
+    async def metrics():
+        # Formato de texto de Prometheus; se arma sólo cuando alguien lo consulta.
+        return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
+# Símbolos por descarga en lote del stream; entre lotes se puede cortar si el cliente se fue.
+_STREAM_CHUNK = int(os.environ.get("TIKPRED_STREAM_CHUNK", "25"))
+
+async def analyze_market_events(symbols: List[str], n_clusters: int = 3):
+    """
+    Eventos de /api/analyze-market en orden de llegada: un {"type": "metrics"}
+    por símbolo apenas se resuelve y un {"type": "clusters"} final. Si el
+    consumidor deja de iterar (cliente desconectado), se cancelan los lotes y
+    símbolos pendientes; una descarga ya en curso en un hilo termina y queda en caché.
+    """
+    uniq = list(dict.fromkeys(symbols))
+    ready: "asyncio.Queue" = asyncio.Queue()
+    tasks: set = set()
+
+    async def one(symbol: str):
+        try:
+            m = await compute_metrics_async(symbol)
+        except Exception as e:
+            print(f"[ERROR] Fallo métricas de {symbol}: {e}")
+            m = {"symbol": symbol, "returns": None, "volatility": None, "volume_avg": None}
+        ready.put_nowait(m)
+
+    async def produce():
+        for i in range(0, len(uniq), _STREAM_CHUNK):
+            chunk = uniq[i:i + _STREAM_CHUNK]
+            try:
+                await asyncio.to_thread(prefetch_history, chunk, "60d")
+            except Exception as e:
+                print(f"[ERROR] Fallo prefetch_history en el stream: {e}")
+            for sym in chunk:
+                tasks.add(asyncio.ensure_future(one(sym)))
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        rows = []
+        for _ in uniq:
+            m = await ready.get()
+            rows.append(m)
+            yield dict(m, type="metrics")
+        clusters = await asyncio.to_thread(models.cluster, rows, n_clusters)
+        yield {"type": "clusters", "version": clusters[0]["version"] if clusters else None, "clusters": clusters}
+    finally:
+        producer.cancel()
+        for t in tasks:
+            t.cancel()
+
+# Límites de /api/recommend: símbolos por request y vecinos por símbolo.
+_MAX_RECOMMEND = int(os.environ.get("TIKPRED_RECOMMEND_MAX", "100"))
+_MAX_SIMILAR = 50
+
+def _recommend_symbols(raw: Any) -> List[str]:
+    if raw is None:
+        return []
+    if not isinstance(raw, list) or not all(isinstance(s, str) for s in raw):
+        raise ValueError("'symbols' debe ser una lista de strings")
+    if len(raw) > _MAX_RECOMMEND:
+        raise ValueError(f"Máximo {_MAX_RECOMMEND} símbolos por request")
+    return raw
+
+def _similar_k(raw: Any) -> Optional[int]:
+    """Valida `similar`: None/0 = sin vecinos; un entero positivo se acota a _MAX_SIMILAR."""
+    if raw is None:
+        return None
+    if isinstance(raw, bool) or not isinstance(raw, (int, str)):
+        raise ValueError("'similar' debe ser un entero")
+    try:
+        k = int(raw)
+    except ValueError:
+        raise ValueError("'similar' debe ser un entero") from None
+    if k < 0:
+        raise ValueError("'similar' no puede ser negativo")
+    return min(k, _MAX_SIMILAR) or None
+
+@telemetry.timed("app.recommend_payload")
+def recommend_payload(symbols: List[str], similar: Optional[int] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+    pool = recommend_many(symbols, deadline)
+    out: Dict[str, Any] = {"recommendations": pool}
+    if similar:
+        # Un solo índice para todo el pool; los vecinos van sin el objeto completo.
+        index = SimilarityIndex.from_pool(pool, k=int(similar))
+        out["similar"] = {
+            sym: [{"symbol": n["symbol"], "distance": n["distance"], "features": n["features"]} for n in nbrs]
+            for sym, nbrs in index.query_many([r["symbol"] for r in pool]).items()
+        }
+    return out
 
 if __name__ == "__main__":
     sample = quotes_payload("AAPL")
     print(json.dumps(sample)[:1000])
-
@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# -----------------------------------------------------------------------------
+# Caché LRU acotada con TTL separado para éxitos y fallos (negative caching),
+# límite opcional de peso (bytes de DataFrames) y contadores de hit/miss.
+# Con stale_ttl > 0 un éxito vencido se conserva ese tiempo extra para servirlo
+# "stale" con get_stale mientras se revalida en segundo plano.
+# -----------------------------------------------------------------------------
+
+_MISSING = object()
+
+def frame_weight(value: Any) -> int:
+    """Peso aproximado en bytes de un DataFrame (o de una tupla que lo contenga)."""
+    if isinstance(value, tuple):
+        return sum(frame_weight(v) for v in value)
+    try:
+        return int(value.memory_usage(index=True).sum())
+    except Exception:
+        return 1
+
+class TTLCache:
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        ttl: float = 900.0,
+        negative_ttl: float = 60.0,
+        max_weight: Optional[int] = None,
+        weigher: Optional[Callable[[Any], int]] = None,
+        stale_ttl: float = 0.0,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_weight = max_weight
+        self._weigher = weigher
+        self.stale_ttl = stale_ttl
+        # key -> (value, expires_at, weight, stale_until)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._weight = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        _CACHES.append(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return self._lookup(key, default, allow_stale=False)[0]
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Tuple[Any, bool]:
+        """
+        (valor, vencido). Un valor vencido dentro de su ventana stale_ttl se
+        retorna con vencido=True; fuera de ella es un miss: (default, False).
+        """
+        return self._lookup(key, default, allow_stale=True)
+
+    def _lookup(self, key: Hashable, default: Any, allow_stale: bool) -> Tuple[Any, bool]:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default, False
+            now = time.monotonic()
+            if item[1] <= now:
+                if item[3] <= now:
+                    self._drop(key)
+                    self.expirations += 1
+                elif allow_stale:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    return item[0], True
+                self.misses += 1
+                return default, False
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0], False
+
+    def ttl_left(self, key: Hashable) -> Optional[float]:
+        """Segundos de vigencia que le quedan a la clave (negativo si está vencida); None si no está."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            return None if item is _MISSING else item[1] - time.monotonic()
+
+    def set(self, key: Hashable, value: Any, ok: bool = True) -> None:
+        ttl = self.ttl if ok else self.negative_ttl
+        weight = self._weigher(value) if self._weigher is not None else 1
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            if ttl <= 0:
+                return
+            expires = time.monotonic() + ttl
+            # Sólo los éxitos se sirven vencidos; un fallo se reintenta al expirar.
+            self._data[key] = (value, expires, weight, expires + (self.stale_ttl if ok else 0.0))
+            self._weight += weight
+            while len(self._data) > self.maxsize or (
+                self.max_weight is not None and self._weight > self.max_weight and len(self._data) > 1
+            ):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            self._drop(key)
+            return item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def _drop(self, key: Hashable) -> None:
+        item = self._data.pop(key)
+        self._weight -= item[2]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": float(len(self._data)),
+                "weight": float(self._weight),
+                "hits": float(self.hits),
+                "misses": float(self.misses),
+                "evictions": float(self.evictions),
+                "expirations": float(self.expirations),
+                "stale_hits": float(self.stale_hits),
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+_CACHES: List[TTLCache] = []
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    return {c.name: c.stats() for c in _CACHES}
@@ -1,4 +1,6 @@
-from typing import Dict, List
+import csv
+import os
+from typing import Dict, Iterator, List, Optional
 
 CATEGORIES: Dict[str, List[str]] = {
     "Tecnología": ["AAPL", "MSFT", "NVDA", "META", "GOOG"],
@@ -13,3 +15,51 @@ def get_symbols_by_category(category: str, n: int = 5) -> List[str]:
     arr = CATEGORIES.get(category) or []
     return arr[:n]
 
+# Archivo de universo: un símbolo por línea (se ignoran vacías y comentarios #)
+# o un CSV con columna "symbol". Sin archivo se usan los símbolos de CATEGORIES.
+UNIVERSE_FILE = os.environ.get("TIKPRED_UNIVERSE_FILE", "")
+
+def _clean(line: str) -> List[str]:
+    s = line.split("#", 1)[0].split(",", 1)[0].strip().upper()
+    return [s] if s else []
+
+def _iter_file(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", newline="") as fh:
+        first = fh.readline()
+        head = [c.strip().lower() for c in first.split(",")]
+        if "symbol" in head:
+            col = head.index("symbol")
+            for row in csv.reader(fh):
+                if len(row) > col and row[col].strip():
+                    yield row[col].strip().upper()
+            return
+        yield from _clean(first)
+        for line in fh:
+            yield from _clean(line)
+
+def iter_universe(path: Optional[str] = None, chunk_size: int = 500) -> Iterator[List[str]]:
+    """
+    Recorre el universo en bloques de `chunk_size` símbolos sin cargar el archivo
+    completo. Los duplicados se descartan (el set de vistos crece con el universo,
+    pero son sólo strings).
+    """
+    path = path or UNIVERSE_FILE
+    if path:
+        source: Iterator[str] = _iter_file(path)
+    else:
+        source = (s for arr in CATEGORIES.values() for s in arr)
+    seen = set()
+    chunk: List[str] = []
+    for s in source:
+        if s in seen:
+            continue
+        seen.add(s)
+        chunk.append(s)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def load_universe(path: Optional[str] = None) -> List[str]:
+    return [s for chunk in iter_universe(path) for s in chunk]
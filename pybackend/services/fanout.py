@@ -0,0 +1,84 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+
+# -----------------------------------------------------------------------------
+# Fan-out concurrente con deadline por request: las fuentes independientes
+# (métricas, info, histórico, noticias) se piden a la vez y la latencia pasa a
+# ser la de la más lenta, acotada por el deadline. Lo que no llega a tiempo se
+# devuelve como None y se reporta; la llamada sigue en segundo plano y deja su
+# resultado en las cachés para el siguiente request.
+# -----------------------------------------------------------------------------
+
+DEFAULT_DEADLINE = float(os.environ.get("TIKPRED_REQUEST_DEADLINE", "8"))
+
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("TIKPRED_FANOUT_WORKERS", "32")),
+    thread_name_prefix="fanout",
+)
+
+Call = Tuple[Any, ...]
+
+def gather(
+    calls: Dict[str, Call],
+    deadline: Optional[float] = None,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Ejecuta cada `(fn, *args)` de `calls` en paralelo. Retorna los resultados por
+    nombre y la lista de nombres que no terminaron antes del deadline. Los lotes
+    grandes pasan su propio `executor` para no ocupar el pool compartido.
+    """
+    timeout = DEFAULT_DEADLINE if deadline is None else deadline
+    pool = executor or _EXECUTOR
+    futs = {name: pool.submit(call[0], *call[1:]) for name, call in calls.items()}
+    wait(list(futs.values()), timeout=timeout)
+    results: Dict[str, Any] = {}
+    missed: List[str] = []
+    for name, fut in futs.items():
+        if not fut.done():
+            missed.append(name)
+            results[name] = None
+            continue
+        try:
+            results[name] = fut.result()
+        except Exception as e:
+            print(f"[ERROR] Fallo la fuente '{name}': {e}")
+            results[name] = None
+    return results, missed
+
+# Tareas vencidas que siguen corriendo; se guarda la referencia para que el
+# event loop no las recolecte antes de que llenen las cachés.
+_BACKGROUND: Set["asyncio.Task"] = set()
+
+async def gather_async(calls: Dict[str, Awaitable], deadline: Optional[float] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Igual que `gather`, pero con corrutinas sobre el event loop actual."""
+    timeout = DEFAULT_DEADLINE if deadline is None else deadline
+    tasks = {name: asyncio.ensure_future(aw) for name, aw in calls.items()}
+    if tasks:
+        await asyncio.wait(list(tasks.values()), timeout=timeout)
+    results: Dict[str, Any] = {}
+    missed: List[str] = []
+    for name, task in tasks.items():
+        if not task.done():
+            missed.append(name)
+            results[name] = None
+            _BACKGROUND.add(task)
+            task.add_done_callback(_BACKGROUND.discard)
+            continue
+        try:
+            results[name] = task.result()
+        except Exception as e:
+            print(f"[ERROR] Fallo la fuente '{name}': {e}")
+            results[name] = None
+    return results, missed
+
+def timed_out_fields(missed: List[str], fields: Dict[str, List[str]]) -> List[str]:
+    """Traduce fuentes vencidas a los campos de respuesta que quedaron en null."""
+    out: List[str] = []
+    for name in missed:
+        for f in fields.get(name, [name]):
+            if f not in out:
+                out.append(f)
+    return out
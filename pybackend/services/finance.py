@@ -1,7 +1,12 @@
-import math
+import os
 import time
-import random
-from typing import List, Dict, Optional
+import datetime as dt
+from typing import Any, List, Dict, Optional
+
+from pybackend.services import httpclient, providers, ratelimit, storage, telemetry
+from pybackend.services.cache import TTLCache, frame_weight
+from pybackend.services.metrics import compute_metrics_frames
+from pybackend.services.singleflight import SingleFlight
 
 def _get_session():
     # requests_cache es incompatible con las nuevas versiones de yfinance que usan curl_cffi
@@ -15,20 +20,25 @@ def _get_session():
     #     # ...
 
 
-def _stooq_download(symbol: str, period_days: int = 180):
+def _stooq_download(symbol: str, period_days: int = 180, start=None, end=None):
     try:
         import pandas as pd
-        import urllib.request
         s = symbol.lower()
         url = f"https://stooq.com/q/d/l/?s={s}&i=d"
-        with urllib.request.urlopen(url, timeout=10) as resp:
-            csv = resp.read().decode("utf-8", errors="ignore")
+        if start is not None:
+            url += f"&d1={pd.Timestamp(start).strftime('%Y%m%d')}"
+        if end is not None:
+            url += f"&d2={pd.Timestamp(end).strftime('%Y%m%d')}"
+        with ratelimit.limiter("stooq").slot():
+            csv = httpclient.get_text(url, "stooq.com", timeout=10)
         from io import StringIO
         df = pd.read_csv(StringIO(csv))
         if df is None or df.empty:
             return None
         df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
         df = df.dropna(subset=["Date"]).set_index("Date").sort_index()
+        if start is not None:
+            return df
         # Tail to desired period
         return df.tail(period_days)
     except Exception:
@@ -41,135 +51,499 @@ def _import_yf():
     except Exception:
         return None
 
-_INFO_CACHE: Dict[str, Dict[str, Optional[float]]] = {}
+# How long past its TTL an entry may still be served while it is refreshed
+# in the background (stale-while-revalidate).
+_STALE_TTL = float(os.environ.get("TIKPRED_STALE_TTL", "3600"))
+
+# Failures are kept only briefly so a transient Yahoo error heals on its own.
+_INFO_CACHE = TTLCache(
+    "info",
+    maxsize=int(os.environ.get("TIKPRED_INFO_CACHE_SIZE", "2048")),
+    ttl=float(os.environ.get("TIKPRED_INFO_TTL", "3600")),
+    negative_ttl=float(os.environ.get("TIKPRED_NEGATIVE_TTL", "60")),
+    stale_ttl=_STALE_TTL,
+)
+
+# Concurrent cold requests for the same symbol share one upstream fetch.
+_FLIGHTS = SingleFlight()
 
+@telemetry.timed("finance.get_ticker_info")
 def get_ticker_info(symbol: str) -> Dict[str, Optional[float]]:
-    yf = _import_yf()
-    if yf is None:
-        return {
-            "symbol": symbol,
-            "trailingPE": None,
-            "beta": None,
-            "marketCap": None,
-            "sector": None,
-        }
-    if symbol in _INFO_CACHE:
-        return _INFO_CACHE[symbol]
+    cached = _cached_info(symbol)
+    if cached is not None:
+        return cached
+    return _FLIGHTS.do(f"info:{symbol}", _fetch_ticker_info, symbol)
+
+def _cached_info(symbol: str):
+    cached, stale = _INFO_CACHE.get_stale(symbol)
+    if stale:
+        _FLIGHTS.do_background(f"info:{symbol}", _fetch_ticker_info, symbol)
+    return cached
+
+@telemetry.timed("finance.get_ticker_info_async")
+async def get_ticker_info_async(symbol: str) -> Dict[str, Optional[float]]:
+    cached = _cached_info(symbol)
+    if cached is not None:
+        return cached
+    # yfinance is sync-only: the leader runs in the executor, waiters just await.
+    return await _FLIGHTS.do_async(f"info:{symbol}", _fetch_ticker_info, symbol)
+
+_INFO_FIELDS = ["trailingPE", "beta", "marketCap", "sector", "shortName", "longName"]
+
+@telemetry.timed("finance.fetch_ticker_info")
+def _fetch_ticker_info(symbol: str) -> Dict[str, Optional[float]]:
     try:
-        session = _get_session()
-        t = yf.Ticker(symbol, session=session) if session is not None else yf.Ticker(symbol)
-        info = t.info or {}
-        # Fast info overlay when available
-        try:
-            fi = getattr(t, "fast_info", None)
-            if fi:
-                if info.get("marketCap") is None:
-                    info["marketCap"] = getattr(fi, "market_cap", None)
-        except Exception:
-            pass
-        result = {
-            "symbol": symbol,
-            "trailingPE": info.get("trailingPE"),
-            "beta": info.get("beta"),
-            "marketCap": info.get("marketCap"),
-            "sector": info.get("sector"),
-            "shortName": info.get("shortName"),
-            "longName": info.get("longName"),
-        }
-        _INFO_CACHE[symbol] = result
+        info = providers.get_provider().info(symbol)
+        fields = {k: info.get(k) for k in _INFO_FIELDS} if info else {}
+        if not any(v is not None for v in fields.values()):
+            # Respuesta vacía (fallo transitorio o throttling): cuenta como fallo
+            # y se reintenta tras el TTL negativo, no tras el TTL completo.
+            raise LookupError(f"sin info para {symbol}")
+        result = {"symbol": symbol, **fields}
+        _INFO_CACHE.set(symbol, result)
         return result
     except Exception:
-        result = {
-            "symbol": symbol,
-            "trailingPE": None,
-            "beta": None,
-            "marketCap": None,
-            "sector": None,
-            "shortName": None,
-            "longName": None,
-        }
-        _INFO_CACHE[symbol] = result
+        result = {"symbol": symbol, **{k: None for k in _INFO_FIELDS}}
+        _INFO_CACHE.set(symbol, result, ok=False)
         return result
 
-_HIST_CACHE: Dict[str, any] = {}
-
-def get_historical(symbol: str, period: str = "90d"):
+def _live_info(symbol: str) -> Optional[Dict[str, Optional[float]]]:
+    """Raw fields from yfinance; None when yfinance is not installed or Yahoo returned nothing."""
     yf = _import_yf()
     if yf is None:
         return None
-    cache_key = f"{symbol}:{period}"
-    if cache_key in _HIST_CACHE:
-        return _HIST_CACHE[cache_key]
-    # Retry/backoff + Ticker.history fallback
     session = _get_session()
-    for attempt in range(2):
+    t = yf.Ticker(symbol, session=session) if session is not None else yf.Ticker(symbol)
+    with ratelimit.limiter("yahoo").slot() as slot:
+        info = t.info or {}
+        if not any(info.get(k) is not None for k in _INFO_FIELDS):
+            slot.fail()
+    # Fast info overlay when available
+    try:
+        fi = getattr(t, "fast_info", None)
+        if fi:
+            if info.get("marketCap") is None:
+                with ratelimit.limiter("yahoo").slot():
+                    info["marketCap"] = getattr(fi, "market_cap", None)
+    except Exception:
+        pass
+    fields = {k: info.get(k) for k in _INFO_FIELDS}
+    return fields if any(v is not None for v in fields.values()) else None
+
+# Minimum window fetched per symbol so the usual 60d/70d/90d requests share one download.
+_HIST_WINDOW_DAYS = int(os.environ.get("TIKPRED_HIST_WINDOW_DAYS", "90"))
+
+# Stored bars younger than this are served without asking upstream for a delta.
+_STORE_FRESH_SECONDS = float(os.environ.get("TIKPRED_STORE_FRESH_SECONDS", "900"))
+
+# symbol -> (DataFrame or None, days covered). One superset window per symbol;
+# every shorter period is served as a tail slice of it.
+_HIST_CACHE = TTLCache(
+    "history",
+    maxsize=int(os.environ.get("TIKPRED_HIST_CACHE_SIZE", "1024")),
+    ttl=_STORE_FRESH_SECONDS,
+    negative_ttl=float(os.environ.get("TIKPRED_NEGATIVE_TTL", "60")),
+    max_weight=int(os.environ.get("TIKPRED_HIST_CACHE_BYTES", str(256 * 1024 * 1024))),
+    weigher=frame_weight,
+    stale_ttl=_STALE_TTL,
+)
+# auto_adjust rewrites past prices after dividends/splits, so the stored series
+# is rebuilt from scratch once it gets this old instead of only appending.
+_STORE_REBASE_SECONDS = float(os.environ.get("TIKPRED_STORE_REBASE_SECONDS", str(7 * 86400)))
+
+_OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+
+def _period_days(period: str) -> int:
+    p = (period or "").strip().lower()
+    if p == "max":
+        return 365 * 30
+    if p == "ytd":
+        return dt.date.today().timetuple().tm_yday
+    for suffix, mult in (("mo", 31), ("wk", 7), ("d", 1), ("y", 366)):
+        if p.endswith(suffix) and p[:-len(suffix)].isdigit():
+            return int(p[:-len(suffix)]) * mult
+    return 90
+
+def _cutoff(days: int):
+    import pandas as pd
+    return pd.Timestamp(dt.date.today()) - pd.Timedelta(days=days)
+
+def _normalize_ohlcv(df, symbol: str):
+    import pandas as pd
+    if df is None or df.empty:
+        return None
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        # yf.download returns (field, ticker) columns even for a single ticker
+        if symbol in df.columns.get_level_values(-1):
+            df = df.xs(symbol, axis=1, level=-1)
+        else:
+            df.columns = df.columns.get_level_values(0)
+    df = df[[c for c in _OHLCV if c in df.columns]]
+    if "Close" not in df.columns:
+        return None
+    idx = pd.to_datetime(df.index)
+    if getattr(idx, "tz", None) is not None:
+        idx = idx.tz_localize(None)
+    df.index = idx.normalize()
+    df.index.name = "Date"
+    df = df.dropna(subset=["Close"])
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    return df if not df.empty else None
+
+@telemetry.timed("finance.fetch_history")
+def _fetch_history(symbol: str, period: Optional[str] = None, start=None, end=None):
+    """Download from upstream: either a full `period` or the bars in [start, end)."""
+    return providers.get_provider().history(symbol, period=period, start=start, end=end)
+
+def _live_history(symbol: str, period: Optional[str] = None, start=None, end=None):
+    yf = _import_yf()
+    if start is not None:
+        span = {"start": start.strftime("%Y-%m-%d")}
+        if end is not None:
+            span["end"] = end.strftime("%Y-%m-%d")
+    else:
+        span = {"period": period}
+    if yf is not None:
+        # Retry/backoff + Ticker.history fallback
+        session = _get_session()
+        yahoo = ratelimit.limiter("yahoo")
+        for attempt in range(2):
+            try:
+                t = yf.Ticker(symbol, session=session) if session is not None else yf.Ticker(symbol)
+                with yahoo.slot() as slot:
+                    df = _normalize_ohlcv(t.history(interval="1d", auto_adjust=True, **span), symbol)
+                    if df is None:
+                        slot.fail()
+                if df is not None:
+                    return df
+            except Exception as e:
+                print(f"[ERROR CRÍTICO] Fallo al descargar {symbol} en get_historical (Ticker.history): {str(e)}")
+                pass
+            telemetry.inc("tikpred_fallbacks_total", path="history", source="yf.download")
+            try:
+                kwargs = {"interval": "1d", "progress": False, "auto_adjust": True, "threads": False, **span}
+                if session is not None:
+                    kwargs["session"] = session
+                with yahoo.slot() as slot:
+                    df = _normalize_ohlcv(yf.download(symbol, **kwargs), symbol)
+                    if df is None:
+                        slot.fail()
+                if df is not None:
+                    return df
+            except Exception as e:
+                print(f"[ERROR CRÍTICO] Fallo al descargar {symbol} en get_historical (yf.download): {str(e)}")
+                pass
+            if attempt == 0:
+                yahoo.backoff(attempt)
+    # Fallback to Stooq CSV
+    telemetry.inc("tikpred_fallbacks_total", path="history", source="stooq")
+    days = _period_days(period) if period else 180
+    df = _normalize_ohlcv(_stooq_download(symbol, period_days=days, start=start, end=end), symbol)
+    if df is not None and end is not None:
+        df = df[df.index < end]
+    return df if df is not None and not df.empty else None
+
+def _read_store(symbol: str):
+    try:
+        return storage.load_prices(symbol)
+    except Exception as e:
+        print(f"[ERROR] No se pudo leer el almacén de precios de {symbol}: {e}")
+        return None, {}
+
+def _store_usable(stored, meta, now: float) -> bool:
+    return (
+        stored is not None
+        and not stored.empty
+        and meta.get("start") is not None
+        and now - float(meta.get("rebased_at", 0)) < _STORE_REBASE_SECONDS
+    )
+
+def _load_history(symbol: str, days: int):
+    """
+    Serve the last `days` calendar days from the on-disk store, asking upstream
+    only for the bars after the last stored date. A window wider than the stored
+    one is widened by fetching just the missing head; a full download happens
+    only for an empty store or a due rebase.
+    """
+    cutoff = _cutoff(days)
+    start_key = cutoff.strftime("%Y-%m-%d")
+    now = time.time()
+    stored, meta = _read_store(symbol)
+    has_stored = stored is not None and not stored.empty
+    usable = _store_usable(stored, meta, now)
+    if usable and meta["start"] > start_key:
+        import pandas as pd
+        head = _fetch_history(symbol, start=cutoff, end=pd.Timestamp(meta["start"]))
+        if head is not None:
+            stored = _concat_last(head, stored)
+            try:
+                # Widening rewrites the whole series once; later deltas append again.
+                storage.write_prices(symbol, stored, **{**meta, "start": start_key})
+            except Exception as e:
+                print(f"[ERROR] No se pudo escribir el almacén de precios de {symbol}: {e}")
+    if usable:
+        if now - float(meta.get("fetched_at", 0)) >= _STORE_FRESH_SECONDS:
+            # Re-request the last stored bar too: it may have been an intraday partial.
+            delta = _fetch_history(symbol, start=stored.index[-1])
+            if delta is not None:
+                # fetched_at sólo avanza si upstream respondió; si no, las barras
+                # viejas no deben parecer frescas y el próximo request reintenta.
+                try:
+                    storage.append_prices(symbol, delta, fetched_at=now)
+                except Exception as e:
+                    print(f"[ERROR] No se pudo escribir el almacén de precios de {symbol}: {e}")
+                stored = _concat_last(stored, delta)
+        return stored[stored.index >= cutoff]
+    df = _fetch_history(symbol, period=f"{days}d")
+    if df is not None:
         try:
-            t = yf.Ticker(symbol, session=session) if session is not None else yf.Ticker(symbol)
-            df = t.history(period=period, interval="1d", auto_adjust=True)
-            if df is not None and not df.empty:
-                _HIST_CACHE[cache_key] = df
-                return df
+            storage.write_prices(symbol, df, start=start_key, fetched_at=now, rebased_at=now)
         except Exception as e:
-            print(f"[ERROR CRÍTICO] Fallo al descargar {symbol} en get_historical (Ticker.history): {str(e)}")
-            pass
+            print(f"[ERROR] No se pudo escribir el almacén de precios de {symbol}: {e}")
+        return df[df.index >= cutoff]
+    if has_stored:
+        # Upstream is down: stale bars beat no bars.
+        return stored[stored.index >= cutoff]
+    return None
+
+def _concat_last(base, delta):
+    import pandas as pd
+    df = pd.concat([base, delta])
+    return df[~df.index.duplicated(keep="last")].sort_index()
+
+def _tail(df, days: int):
+    # iloc on a contiguous range returns a view of the cached frame, no copy.
+    return df.iloc[df.index.searchsorted(_cutoff(days)):]
+
+def _serve(df, days: int):
+    if df is None:
+        return None
+    df = _tail(df, days)
+    return df if not df.empty else None
+
+def slice_period(df, period: str):
+    """Recorte de `period` ("60d") de un histórico más largo, sin copiar; None si queda vacío."""
+    return _serve(df, _period_days(period))
+
+def _history_window(symbol: str, days: int):
+    """Return (cached entry, None) on a hit, or (None, window to load) on a miss."""
+    cached, stale = _HIST_CACHE.get_stale(symbol)
+    if cached is not None and cached[1] >= days:
+        if stale:
+            _FLIGHTS.do_background(f"hist:{symbol}:{cached[1]}", _fill_history, symbol, cached[1])
+        return cached, None
+    return None, max(days, _HIST_WINDOW_DAYS, cached[1] if cached is not None and cached[0] is not None else 0)
+
+@telemetry.timed("finance.get_historical")
+def get_historical(symbol: str, period: str = "90d"):
+    days = _period_days(period)
+    cached, window = _history_window(symbol, days)
+    if cached is not None:
+        return _serve(cached[0], days)
+    return _serve(_FLIGHTS.do(f"hist:{symbol}:{window}", _fill_history, symbol, window), days)
+
+@telemetry.timed("finance.get_historical_async")
+async def get_historical_async(symbol: str, period: str = "90d"):
+    days = _period_days(period)
+    cached, window = _history_window(symbol, days)
+    if cached is not None:
+        return _serve(cached[0], days)
+    return _serve(await _FLIGHTS.do_async(f"hist:{symbol}:{window}", _fill_history, symbol, window), days)
+
+@telemetry.timed("finance.fill_history")
+def _fill_history(symbol: str, window: int):
+    df = _load_history(symbol, window)
+    if df is not None and not df.empty:
+        _HIST_CACHE.set(symbol, (df, window))
+        return df
+    _HIST_CACHE.set(symbol, (None, window), ok=False)
+    return None
+
+_BULK_CHUNK = int(os.environ.get("TIKPRED_BULK_CHUNK", "50"))
+
+def _split_wide(df, chunk: List[str]) -> Dict[str, any]:
+    import pandas as pd
+    out: Dict[str, any] = {}
+    if df is None or df.empty:
+        return out
+    for s in chunk:
+        sub = None
+        if isinstance(df.columns, pd.MultiIndex):
+            if s in df.columns.get_level_values(0):
+                sub = df[s]
+            elif s in df.columns.get_level_values(-1):
+                sub = df.xs(s, axis=1, level=-1)
+        elif len(chunk) == 1:
+            sub = df
+        sub = _normalize_ohlcv(sub, s)
+        if sub is not None:
+            out[s] = sub
+    return out
+
+@telemetry.timed("finance.download_many")
+def _download_many(symbols: List[str], **span) -> Dict[str, any]:
+    """Batched history for many symbols; returns only the symbols that came back."""
+    if not symbols:
+        return {}
+    return providers.get_provider().history_many(symbols, **span)
+
+def _live_download_many(symbols: List[str], **span) -> Dict[str, any]:
+    """One multi-ticker yf.download per chunk."""
+    yf = _import_yf()
+    if yf is None or not symbols:
+        return {}
+    out: Dict[str, any] = {}
+    session = _get_session()
+    for i in range(0, len(symbols), _BULK_CHUNK):
+        chunk = symbols[i:i + _BULK_CHUNK]
         try:
-            kwargs = {"period": period, "interval": "1d", "progress": False, "auto_adjust": True, "threads": False}
+            kwargs = {"interval": "1d", "progress": False, "auto_adjust": True,
+                      "threads": True, "group_by": "ticker", **span}
             if session is not None:
                 kwargs["session"] = session
-            df = yf.download(symbol, **kwargs)
-            if df is not None and not df.empty:
-                _HIST_CACHE[cache_key] = df
-                return df
+            with ratelimit.limiter("yahoo").slot() as slot:
+                got = _split_wide(yf.download(" ".join(chunk), **kwargs), chunk)
+                if not got:
+                    slot.fail()
+            out.update(got)
         except Exception as e:
-            print(f"[ERROR CRÍTICO] Fallo al descargar {symbol} en get_historical (yf.download): {str(e)}")
-            pass
-        time.sleep(0.5 + random.random()*0.5)
-    # Fallback to Stooq CSV
-    df = _stooq_download(symbol)
-    if df is not None and not df.empty:
-        _HIST_CACHE[cache_key] = df
-        return df
-    return None
+            print(f"[ERROR CRÍTICO] Fallo la descarga múltiple ({len(chunk)} símbolos): {str(e)}")
+    return out
+
+@telemetry.timed("finance.prefetch_history")
+def prefetch_history(symbols: List[str], period: str = "90d", refresh: bool = False) -> None:
+    """
+    Warm the store and `_HIST_CACHE` for many symbols with as few upstream calls
+    as possible: symbols with no usable stored window share full-window batch
+    downloads, and symbols with stale bars are batched by their last stored date.
+    Symbols missing from the batch results are left to get_historical, which
+    retries them one by one (and through Stooq). With `refresh`, cached entries
+    and recently fetched bars are asked for a delta anyway.
+    """
+    days = _period_days(period)
+    window = max(days, _HIST_WINDOW_DAYS)
+    start_key = _cutoff(window).strftime("%Y-%m-%d")
+    now = time.time()
+    full: List[str] = []
+    deltas: Dict[any, List[str]] = {}
+    for s in dict.fromkeys(symbols):
+        cached = None if refresh else _HIST_CACHE.get(s)
+        if cached is not None and cached[0] is not None and cached[1] >= window:
+            continue
+        stored, meta = _read_store(s)
+        if not _store_usable(stored, meta, now) or meta["start"] > start_key:
+            full.append(s)
+        elif refresh or now - float(meta.get("fetched_at", 0)) >= _STORE_FRESH_SECONDS:
+            deltas.setdefault(stored.index[-1], []).append(s)
+    cutoff = _cutoff(window)
+    for s, df in _download_many(full, period=f"{window}d").items():
+        try:
+            storage.write_prices(s, df, start=start_key, fetched_at=now, rebased_at=now)
+        except Exception as e:
+            print(f"[ERROR] No se pudo escribir el almacén de precios de {s}: {e}")
+        _HIST_CACHE.set(s, (df[df.index >= cutoff], window))
+    for start, group in deltas.items():
+        fetched = _download_many(group, start=start.strftime("%Y-%m-%d"))
+        if not fetched:
+            # Whole batch failed: get_historical will ask for each delta on its own.
+            continue
+        for s in group:
+            # A symbol absent from the batch may have failed on its own: leave its
+            # fetched_at alone so get_historical retries it instead of trusting old bars.
+            if s not in fetched:
+                continue
+            try:
+                storage.append_prices(s, fetched[s], fetched_at=now)
+            except Exception as e:
+                print(f"[ERROR] No se pudo escribir el almacén de precios de {s}: {e}")
+
+@telemetry.timed("finance.refresh_history")
+def refresh_history(symbols: List[str], period: str = "90d", horizon: float = 0.0) -> int:
+    """
+    Refresh the symbols whose cached history expires within `horizon` seconds
+    (or is missing): one batched delta download, then the cache entries are
+    rebuilt from the store. Used by the pre-warm scheduler; returns how many
+    symbols were due.
+    """
+    window = max(_period_days(period), _HIST_WINDOW_DAYS)
+    due = []
+    for s in dict.fromkeys(symbols):
+        left = _HIST_CACHE.ttl_left(s)
+        if left is None or left <= horizon:
+            due.append(s)
+    if not due:
+        return 0
+    try:
+        prefetch_history(due, period=period, refresh=True)
+    except Exception as e:
+        print(f"[ERROR] Fallo prefetch_history en refresh_history: {str(e)}")
+    for s in due:
+        left = _HIST_CACHE.ttl_left(s)
+        if left is not None and left > horizon:
+            continue  # already rebuilt by a full batch download
+        cached, _ = _HIST_CACHE.get_stale(s)
+        span = max(window, cached[1]) if cached is not None else window
+        try:
+            _FLIGHTS.do(f"hist:{s}:{span}", _fill_history, s, span)
+        except Exception as e:
+            print(f"[ERROR] No se pudo refrescar el histórico de {s}: {e}")
+    return len(due)
+
+@telemetry.timed("finance.refresh_info")
+def refresh_info(symbol: str, horizon: float = 0.0) -> bool:
+    """Re-fetch info if it expires within `horizon` seconds; returns whether it did."""
+    left = _INFO_CACHE.ttl_left(symbol)
+    if left is not None and left > horizon:
+        return False
+    _FLIGHTS.do(f"info:{symbol}", _fetch_ticker_info, symbol)
+    return True
 
+@telemetry.timed("finance.compute_metrics")
 def compute_metrics(symbol: str) -> Dict[str, Optional[float]]:
-    df = get_historical(symbol, period="60d")
-    if df is None or df.empty:
-        return {"symbol": symbol, "returns": None, "volatility": None, "volume_avg": None}
+    return _metrics_from_frame(symbol, get_historical(symbol, period="60d"))
+
+@telemetry.timed("finance.compute_metrics_async")
+async def compute_metrics_async(symbol: str) -> Dict[str, Optional[float]]:
+    return _metrics_from_frame(symbol, await get_historical_async(symbol, period="60d"))
+
+def _metrics_from_frame(symbol: str, df) -> Dict[str, Optional[float]]:
     try:
-        closes = df["Close"].astype(float)
-        rets = closes.pct_change().dropna()
-        last30 = rets.tail(30)
-        volatility = float(last30.std()) if len(last30) > 0 else float(rets.std()) if len(rets) else None
-        returns_mean = float(rets.mean()) if len(rets) else None
-        vol_series = df["Volume"].astype(float)
-        volume_avg = float(vol_series.tail(60).mean()) if len(vol_series) else None
-        if volatility is not None and math.isnan(volatility):
-            volatility = None
-        if returns_mean is not None and math.isnan(returns_mean):
-            returns_mean = None
-        if volume_avg is not None and math.isnan(volume_avg):
-            volume_avg = None
-        return {
-            "symbol": symbol,
-            "returns": returns_mean,
-            "volatility": volatility,
-            "volume_avg": volume_avg,
-        }
+        return compute_metrics_frames([symbol], {symbol: df})[0]
     except Exception:
         return {"symbol": symbol, "returns": None, "volatility": None, "volume_avg": None}
 
-def compute_metrics_bulk(symbols: List[str]) -> List[Dict[str, Optional[float]]]:
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    out_map: Dict[str, Dict[str, Optional[float]]] = {}
-    workers = max(1, min(3, len(symbols)))
+@telemetry.timed("finance.get_historical_many")
+def get_historical_many(symbols: List[str], period: str = "90d") -> Dict[str, Any]:
+    """
+    {symbol: DataFrame | None} for many symbols: one batched prefetch, then
+    per-symbol reads that are mostly cache hits. Only the symbols the batch
+    missed go through the per-symbol/Stooq fallback.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    try:
+        prefetch_history(symbols, period=period)
+    except Exception as e:
+        print(f"[ERROR CRÍTICO] Fallo prefetch_history: {str(e)}")
+    uniq = list(dict.fromkeys(symbols))
+    if not uniq:
+        return {}
+    # The Yahoo limiter decides how many of these actually run at once.
+    workers = max(1, min(ratelimit.limiter("yahoo").max_concurrency, len(uniq)))
     with ThreadPoolExecutor(max_workers=workers) as ex:
-        futs = {ex.submit(compute_metrics, s): s for s in symbols}
-        for fut in as_completed(futs):
-            s = futs[fut]
-            try:
-                out_map[s] = fut.result()
-            except Exception:
-                out_map[s] = {"symbol": s, "returns": None, "volatility": None, "volume_avg": None}
-            time.sleep(0.3)
-    return [out_map[s] for s in symbols]
+        return dict(zip(uniq, ex.map(lambda s: get_historical(s, period=period), uniq)))
 
+@telemetry.timed("finance.compute_metrics_bulk")
+def compute_metrics_bulk(symbols: List[str], **windows) -> List[Dict[str, Optional[float]]]:
+    """
+    Same dict shape as compute_metrics, one per symbol. `windows` are passed to
+    metrics.compute_metrics_matrix (returns_window, vol_window, volume_window).
+    """
+    uniq = list(dict.fromkeys(symbols))
+    frames = get_historical_many(uniq, period="60d")
+    try:
+        by_symbol = {m["symbol"]: m for m in compute_metrics_frames(uniq, frames, **windows)}
+    except Exception as e:
+        print(f"[ERROR CRÍTICO] Fallo compute_metrics_frames: {str(e)}")
+        by_symbol = {}
+    return [by_symbol.get(s) or {"symbol": s, "returns": None, "volatility": None, "volume_avg": None} for s in symbols]
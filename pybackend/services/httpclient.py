@@ -0,0 +1,95 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, Tuple
+
+# -----------------------------------------------------------------------------
+# Clientes HTTP compartidos con keep-alive, uno por host. Con httpx se reutiliza
+# la conexión TCP+TLS entre llamadas; sin httpx se cae a urllib (una conexión
+# nueva por request, como antes).
+# -----------------------------------------------------------------------------
+
+_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+_MAX_CONNECTIONS = int(os.environ.get("TIKPRED_HTTP_MAX_CONNECTIONS", "100"))
+_MAX_KEEPALIVE = int(os.environ.get("TIKPRED_HTTP_MAX_KEEPALIVE", "20"))
+
+def _try_import_httpx():
+    try:
+        import httpx
+        return httpx
+    except Exception:
+        return None
+
+_SYNC_CLIENTS: Dict[Tuple[str, bool], Any] = {}
+# Los AsyncClient quedan atados a su event loop: se guardan por loop con una
+# referencia débil, así un loop terminado se lleva sus clientes y uno nuevo nunca
+# recibe un cliente de otro loop (aunque reutilice la misma dirección de memoria).
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, bool], Any]]" = weakref.WeakKeyDictionary()
+_LOCK = threading.Lock()
+
+def _limits(httpx):
+    return httpx.Limits(max_connections=_MAX_CONNECTIONS, max_keepalive_connections=_MAX_KEEPALIVE, keepalive_expiry=30.0)
+
+def _sync_client(httpx, host: str, verify: bool):
+    key = (host, verify)
+    client = _SYNC_CLIENTS.get(key)
+    if client is None:
+        with _LOCK:
+            client = _SYNC_CLIENTS.get(key)
+            if client is None:
+                client = httpx.Client(limits=_limits(httpx), verify=verify, follow_redirects=True,
+                                      headers={"User-Agent": _USER_AGENT})
+                _SYNC_CLIENTS[key] = client
+    return client
+
+def _async_client(httpx, host: str, verify: bool):
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        clients = _ASYNC_CLIENTS.setdefault(loop, {})
+    client = clients.get((host, verify))
+    if client is None:
+        client = httpx.AsyncClient(limits=_limits(httpx), verify=verify, follow_redirects=True,
+                                   headers={"User-Agent": _USER_AGENT})
+        clients[(host, verify)] = client
+    return client
+
+def _urllib_get(url: str, timeout: float, verify: bool) -> str:
+    import urllib.request
+    ctx = None
+    if not verify:
+        import ssl
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    req = urllib.request.Request(url, headers={"User-Agent": _USER_AGENT})
+    with urllib.request.urlopen(req, timeout=timeout, context=ctx) as resp:
+        return resp.read().decode("utf-8", errors="ignore")
+
+def get_text(url: str, host: str, timeout: float = 10.0, verify: bool = True) -> str:
+    httpx = _try_import_httpx()
+    if httpx is None:
+        return _urllib_get(url, timeout, verify)
+    resp = _sync_client(httpx, host, verify).get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.text
+
+async def get_text_async(url: str, host: str, timeout: float = 10.0, verify: bool = True) -> str:
+    httpx = _try_import_httpx()
+    if httpx is None:
+        return await asyncio.to_thread(_urllib_get, url, timeout, verify)
+    resp = await _async_client(httpx, host, verify).get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.text
+
+async def aclose_all() -> None:
+    with _LOCK:
+        clients = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+    with _LOCK:
+        clients = list(_SYNC_CLIENTS.values())
+        _SYNC_CLIENTS.clear()
+    for client in clients:
+        client.close()
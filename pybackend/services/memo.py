@@ -0,0 +1,108 @@
+import hashlib
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional
+
+from pybackend.services import storage
+from pybackend.services.cache import TTLCache
+
+# -----------------------------------------------------------------------------
+# Memo persistente direccionado por contenido: clave = hash del texto
+# normalizado, valor = un número (puntaje de sentimiento, máscara de motivos).
+# Una caché LRU en memoria evita ir a SQLite por los titulares más repetidos.
+# -----------------------------------------------------------------------------
+
+_WS = re.compile(r"\s+")
+
+def text_key(text: str) -> str:
+    # Sólo se colapsan espacios: VADER distingue mayúsculas ("GOOD" puntúa más
+    # que "good"), así que dos titulares que difieren en caso son claves distintas.
+    norm = _WS.sub(" ", (text or "").strip())
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()
+
+class ContentMemo:
+    def __init__(self, name: str, path: Optional[str] = None, maxsize: int = 50000):
+        self._path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._opened = False
+        self._root: Optional[str] = None
+        self._lock = threading.Lock()
+        # Sin expiración práctica: el contenido de una clave nunca cambia.
+        self._hot = TTLCache(name, maxsize=maxsize, ttl=float("inf"), negative_ttl=0)
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # Requiere self._lock tomado. Si SQLite no está disponible, el memo
+        # sigue funcionando sólo en memoria. Sin ruta explícita, se reabre si el
+        # proveedor de datos activo cambió de directorio (storage.use_namespace).
+        if self._path is None and self._opened and self._root != storage.DATA_DIR:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._opened = False
+        if not self._opened:
+            self._opened = True
+            self._root = storage.DATA_DIR
+            try:
+                conn = sqlite3.connect(self._path or storage.data_path("memo.sqlite"), check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, value REAL)")
+                conn.commit()
+                self._conn = conn
+            except Exception as e:
+                print(f"[ERROR] Memo persistente no disponible: {e}")
+        return self._conn
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        cold = []
+        for k in keys:
+            v = self._hot.get(k)
+            if v is not None:
+                out[k] = v
+            else:
+                cold.append(k)
+        if not cold:
+            return out
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return out
+            try:
+                for i in range(0, len(cold), 500):
+                    part = cold[i:i + 500]
+                    q = "SELECT key, value FROM memo WHERE key IN (%s)" % ",".join("?" * len(part))
+                    for k, v in conn.execute(q, part):
+                        out[k] = v
+                        self._hot.set(k, v)
+            except Exception as e:
+                print(f"[ERROR] Fallo lectura del memo: {e}")
+        return out
+
+    def put_many(self, values: Dict[str, float]) -> None:
+        if not values:
+            return
+        for k, v in values.items():
+            self._hot.set(k, v)
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                conn.executemany("INSERT OR REPLACE INTO memo (key, value) VALUES (?, ?)", list(values.items()))
+                conn.commit()
+            except Exception as e:
+                print(f"[ERROR] Fallo escritura del memo: {e}")
+
+    def clear(self) -> None:
+        """Vacía el memo en memoria y en disco (benchmarks y tests)."""
+        self._hot.clear()
+        with self._lock:
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                conn.execute("DELETE FROM memo")
+                conn.commit()
+            except Exception as e:
+                print(f"[ERROR] Fallo limpieza del memo: {e}")
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional
+
+from pybackend.services import telemetry
+
+# -----------------------------------------------------------------------------
+# Motor vectorizado de métricas transversales: recibe cierres y volúmenes
+# alineados (fechas × símbolos) y calcula retorno medio, volatilidad y volumen
+# promedio de todos los símbolos en una sola pasada de NumPy.
+# -----------------------------------------------------------------------------
+
+def _np():
+    import numpy as np
+    return np
+
+def _compact(a):
+    """
+    Empuja los NaN de cada columna hacia arriba conservando el orden de los
+    valores válidos, así las últimas filas son las últimas observaciones reales
+    de cada símbolo aunque sus calendarios no coincidan.
+    """
+    np = _np()
+    order = np.argsort(~np.isnan(a), axis=0, kind="stable")
+    return np.take_along_axis(a, order, axis=0)
+
+def _tail_mean_std(a, window: Optional[int]):
+    np = _np()
+    t = a[-window:] if window else a
+    valid = ~np.isnan(t)
+    cnt = valid.sum(axis=0)
+    total = np.where(valid, t, 0.0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(cnt > 0, total / cnt, np.nan)
+        dev = np.where(valid, t - mean, 0.0)
+        var = np.where(cnt > 1, (dev * dev).sum(axis=0) / (cnt - 1), np.nan)
+    return mean, np.sqrt(var)
+
+def _none_if_nan(x) -> Optional[float]:
+    x = float(x)
+    return None if x != x else x
+
+@telemetry.timed("metrics.compute_metrics_matrix")
+def compute_metrics_matrix(
+    symbols: List[str],
+    closes,
+    volumes,
+    returns_window: Optional[int] = None,
+    vol_window: int = 30,
+    volume_window: int = 60,
+) -> List[Dict[str, Optional[float]]]:
+    """
+    closes/volumes: arrays (fechas × símbolos) con NaN donde no hay dato.
+    returns_window: barras para el retorno medio (None = toda la serie).
+    vol_window: últimos retornos usados para la volatilidad.
+    volume_window: últimas barras usadas para el volumen promedio.
+    """
+    np = _np()
+    c = _compact(np.asarray(closes, dtype=float))
+    v = _compact(np.asarray(volumes, dtype=float))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rets = c[1:] / c[:-1] - 1.0 if len(c) > 1 else np.full((0, c.shape[1]), np.nan)
+    ret_mean, _ = _tail_mean_std(rets, returns_window)
+    _, vol = _tail_mean_std(rets, vol_window)
+    vol_avg, _ = _tail_mean_std(v, volume_window)
+    return [
+        {
+            "symbol": s,
+            "returns": _none_if_nan(ret_mean[i]),
+            "volatility": _none_if_nan(vol[i]),
+            "volume_avg": _none_if_nan(vol_avg[i]),
+        }
+        for i, s in enumerate(symbols)
+    ]
+
+def align_frames(symbols: List[str], frames: Dict[str, Any], columns=("Close", "Volume")):
+    """
+    Alinea varios históricos OHLCV sobre la unión de sus fechas. Retorna las
+    fechas y una matriz (fechas × símbolos) por columna, con NaN donde falta dato.
+    Usa searchsorted por símbolo en lugar de pd.concat, que domina el costo
+    cuando hay cientos de columnas.
+    """
+    np = _np()
+    present = [(j, frames.get(s)) for j, s in enumerate(symbols)]
+    present = [(j, df) for j, df in present if df is not None and not df.empty]
+    if not present:
+        return np.array([], dtype="datetime64[ns]"), {c: np.full((0, len(symbols)), np.nan) for c in columns}
+    dates = np.unique(np.concatenate([df.index.values for _, df in present]))
+    out = {c: np.full((len(dates), len(symbols)), np.nan) for c in columns}
+    for j, df in present:
+        pos = np.searchsorted(dates, df.index.values)
+        for c in columns:
+            if c in df:
+                out[c][pos, j] = df[c].to_numpy(dtype=float)
+    return dates, out
+
+@telemetry.timed("metrics.compute_metrics_frames")
+def compute_metrics_frames(symbols: List[str], frames: Dict[str, Any], **windows: Any) -> List[Dict[str, Optional[float]]]:
+    """Métricas para `symbols` a partir de sus históricos; los que no tienen datos salen en None."""
+    _, mats = align_frames(symbols, frames)
+    return compute_metrics_matrix(symbols, mats["Close"], mats["Volume"], **windows)
@@ -1,15 +1,16 @@
 from typing import List, Dict, Any, Optional
+from functools import lru_cache
 import math
+import os
+
+from pybackend.services import telemetry
+from pybackend.services.cache import TTLCache
 
 def _try_import_sklearn():
     try:
         from sklearn.cluster import KMeans
-        from sklearn.preprocessing import StandardScaler
-        from sklearn.linear_model import LinearRegression
         return {
             "KMeans": KMeans,
-            "StandardScaler": StandardScaler,
-            "LinearRegression": LinearRegression,
         }
     except Exception:
         return None
@@ -18,10 +19,6 @@ def _np():
     import numpy as np
     return np
 
-def _pd():
-    import pandas as pd
-    return pd
-
 def _centroid_label(centroid: List[float]) -> str:
     vol = centroid[1]
     ret = centroid[0]
@@ -35,70 +32,246 @@ def _centroid_label(centroid: List[float]) -> str:
         return "Especulativo"
     return "Mixto"
 
-def aplicar_kmeans(tickers_data: List[Dict[str, Any]], n_clusters: int = 3) -> List[Dict[str, Any]]:
-    pd = _pd()
+# A partir de este tamaño el modo "auto" usa mini-batch en vez de Lloyd completo.
+_MINIBATCH_THRESHOLD = 10_000
+# Máximo de celdas (filas × centroides) de la matriz de distancias por bloque.
+_CHUNK_CELLS = 1_000_000
+
+# Centroides de la corrida anterior (en escala original) por (universo, número de
+# clusters), para arrancar la siguiente cerca del óptimo. Nunca se comparten entre
+# universos: partir de los centroides de otro puede dejar a KMeans en un óptimo
+# local peor y volver el resultado dependiente del historial del proceso.
+# Acotado como las demás cachés: a lo sumo TIKPRED_WARM_CENTROIDS universos y un día.
+_WARM_CENTROIDS = TTLCache("warm_centroids", maxsize=int(os.environ.get("TIKPRED_WARM_CENTROIDS", "64")),
+                           ttl=86400.0, negative_ttl=0)
+
+def _chunks(n: int, k: int):
+    step = max(1, _CHUNK_CELLS // max(1, k))
+    for start in range(0, n, step):
+        yield start, min(n, start + step)
+
+def _assign(X, C):
+    """Centroide más cercano por fila, por bloques para no materializar n×k×d."""
     np = _np()
-    df = pd.DataFrame(tickers_data)
-    df = df[["symbol", "returns", "volatility", "volume_avg"]].dropna()
-    if df.empty:
-        return []
-    features = df[["returns", "volatility", "volume_avg"]]
-    skl = _try_import_sklearn()
+    labels = np.empty(X.shape[0], dtype=np.int64)
+    cc = (C * C).sum(axis=1)
+    for a, b in _chunks(X.shape[0], C.shape[0]):
+        d = cc[None, :] - 2.0 * (X[a:b] @ C.T)
+        labels[a:b] = d.argmin(axis=1)
+    return labels
+
+def _kmeanspp(X, k: int, rng):
+    np = _np()
+    n = X.shape[0]
+    C = np.empty((k, X.shape[1]))
+    C[0] = X[rng.integers(n)]
+    d2 = ((X - C[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        total = d2.sum()
+        j = rng.choice(n, p=d2 / total) if total > 0 else rng.integers(n)
+        C[i] = X[j]
+        d2 = np.minimum(d2, ((X - C[i]) ** 2).sum(axis=1))
+    return C
+
+def _centroid_means(X, labels, C):
+    np = _np()
+    k = C.shape[0]
+    counts = np.bincount(labels, minlength=k)
+    sums = np.zeros_like(C)
+    np.add.at(sums, labels, X)
+    # Un cluster vacío conserva su centroide anterior.
+    return np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], C)
+
+def _lloyd(X, C, max_iter: int = 50):
+    np = _np()
+    labels = _assign(X, C)
+    for _ in range(max_iter):
+        new_C = _centroid_means(X, labels, C)
+        if np.allclose(new_C, C):
+            break
+        C = new_C
+        labels = _assign(X, C)
+    return labels, C
+
+def _minibatch(X, C, rng, batch_size: int = 2048, max_iter: int = 100, tol: float = 1e-4):
+    """k-means mini-batch (tasa de aprendizaje 1/conteo por centroide)."""
+    np = _np()
+    C = C.copy()
+    counts = np.zeros(C.shape[0])
+    for _ in range(max_iter):
+        batch = X[rng.integers(0, X.shape[0], size=min(batch_size, X.shape[0]))]
+        lab = _assign(batch, C)
+        prev = C.copy()
+        for c in np.unique(lab):
+            pts = batch[lab == c]
+            counts[c] += len(pts)
+            C[c] += (pts.sum(axis=0) - len(pts) * C[c]) / counts[c]
+        if np.abs(C - prev).max() < tol:
+            break
+    return _assign(X, C), C
+
+def _feature_rows(tickers_data: List[Dict[str, Any]]):
+    """Símbolos y matriz (returns, volatility, volume_avg) de las filas completas."""
+    np = _np()
+    rows = []
+    for d in tickers_data:
+        vals = (d.get("symbol"), d.get("returns"), d.get("volatility"), d.get("volume_avg"))
+        if any(v is None for v in vals) or any(v != v for v in vals[1:]):
+            continue
+        rows.append(vals)
+    return [r[0] for r in rows], np.array([r[1:] for r in rows], dtype=float).reshape(-1, 3)
+
+@telemetry.timed("ml.fit_kmeans")
+def fit_kmeans(
+    tickers_data: List[Dict[str, Any]],
+    n_clusters: int = 3,
+    mode: str = "auto",
+    warm_start: bool = False,
+    universe: Optional[str] = None,
+    init_centroids: Optional[List[List[float]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Ajusta escalador y centroides. Retorna un modelo serializable (listas) con
+    media, escala, centroides en escala original y la etiqueta de cada centroide,
+    o None si no hay filas completas.
+
+    mode: "full" (Lloyd/KMeans completo), "minibatch" o "auto" (mini-batch desde
+    _MINIBATCH_THRESHOLD símbolos). Con warm_start se parte de los centroides de
+    la corrida anterior del mismo `universe` (por defecto, el conjunto de símbolos
+    de las filas); `init_centroids` (escala original) tiene prioridad.
+    """
+    np = _np()
+    symbols, features = _feature_rows(tickers_data)
+    if len(features) == 0:
+        return None
+    k = min(n_clusters, len(features))
+    mu = features.mean(axis=0)
+    sigma = features.std(axis=0)
+    sigma = np.where(sigma == 0, 1.0, sigma)
+    X = (features - mu) / sigma
+    init = None
+    warm_key = (universe or hash(tuple(sorted(symbols))), n_clusters)
+    prev = _WARM_CENTROIDS.get(warm_key) if warm_start else None
+    if init_centroids is not None:
+        prev = np.asarray(init_centroids, dtype=float)
+    if prev is not None and prev.shape == (k, features.shape[1]):
+        init = (prev - mu) / sigma
+    use_minibatch = mode == "minibatch" or (mode == "auto" and len(X) >= _MINIBATCH_THRESHOLD)
+    rng = np.random.default_rng(42)
+    skl = _try_import_sklearn() if not use_minibatch else None
     if skl is not None:
-        scaler = skl["StandardScaler"]()
-        X = scaler.fit_transform(features)
-        km = skl["KMeans"](n_clusters=n_clusters, random_state=42)
-        labels = km.fit_predict(X)
-        df["cluster"] = labels
+        if init is not None:
+            km = skl["KMeans"](n_clusters=k, init=init, n_init=1, random_state=42)
+        else:
+            km = skl["KMeans"](n_clusters=k, random_state=42)
+        km.fit(X)
         centers = km.cluster_centers_
-        inv_centers = scaler.inverse_transform(centers)
     else:
-        mu = features.mean()
-        sigma = features.std().replace(0, 1)
-        X = (features - mu) / sigma
-        rng = np.random.default_rng(42)
-        centroids = X.sample(n_clusters, random_state=42).to_numpy()
-        for _ in range(50):
-            dists = np.linalg.norm(X.to_numpy()[:, None, :] - centroids[None, :, :], axis=2)
-            labels = dists.argmin(axis=1)
-            new_centroids = np.vstack([
-                X.to_numpy()[labels == i].mean(axis=0) if (labels == i).any() else centroids[i]
-                for i in range(n_clusters)
-            ])
-            if np.allclose(new_centroids, centroids):
-                break
-            centroids = new_centroids
-        df["cluster"] = labels
-        inv_centers = (centroids * sigma.to_numpy()) + mu.to_numpy()
-    group_map: Dict[int, str] = {}
-    for i in range(n_clusters):
-        c = inv_centers[i]
-        group_map[i] = _centroid_label([float(c[0]), float(c[1])])
-    out: List[Dict[str, Any]] = []
-    for _, row in df.iterrows():
-        out.append({
-            "symbol": row["symbol"],
-            "group": group_map.get(int(row["cluster"]), "Mixto"),
-            "returns": float(row["returns"]),
-            "volatility": float(row["volatility"]),
-        })
-    return out
+        if init is None:
+            sample = X if len(X) <= 50_000 else X[rng.choice(len(X), 50_000, replace=False)]
+            init = _kmeanspp(sample, k, rng)
+        if use_minibatch:
+            _, centers = _minibatch(X, init, rng)
+        else:
+            _, centers = _lloyd(X, init)
+    inv_centers = centers * sigma + mu
+    if warm_start:
+        _WARM_CENTROIDS.set(warm_key, inv_centers)
+    return {
+        "mean": mu.tolist(),
+        "scale": sigma.tolist(),
+        "centroids": inv_centers.tolist(),
+        "labels": [_centroid_label([c[0], c[1]]) for c in inv_centers.tolist()],
+    }
 
-def forecast_next_price(closes: List[float]) -> Optional[float]:
+@telemetry.timed("ml.predict_kmeans")
+def predict_kmeans(model: Dict[str, Any], tickers_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Asigna cada fila al centroide más cercano de un modelo ya ajustado."""
+    np = _np()
+    symbols, features = _feature_rows(tickers_data)
+    if not symbols or not model:
+        return []
+    mu = np.asarray(model["mean"], dtype=float)
+    sigma = np.asarray(model["scale"], dtype=float)
+    centers = (np.asarray(model["centroids"], dtype=float) - mu) / sigma
+    labels = _assign((features - mu) / sigma, centers)
+    groups = np.array(model["labels"], dtype=object)[labels].tolist()
+    return [
+        {"symbol": s, "group": g, "returns": r, "volatility": v}
+        for s, g, r, v in zip(symbols, groups, features[:, 0].tolist(), features[:, 1].tolist())
+    ]
+
+@telemetry.timed("ml.aplicar_kmeans")
+def aplicar_kmeans(
+    tickers_data: List[Dict[str, Any]],
+    n_clusters: int = 3,
+    mode: str = "auto",
+    warm_start: bool = False,
+) -> List[Dict[str, Any]]:
+    """Ajusta y etiqueta en un solo paso (ver fit_kmeans / predict_kmeans)."""
+    model = fit_kmeans(tickers_data, n_clusters, mode=mode, warm_start=warm_start)
+    return predict_kmeans(model, tickers_data) if model else []
+
+# Mínimo de cierres para proyectar; con menos la recta no es confiable.
+_MIN_FORECAST_POINTS = 10
+
+@lru_cache(maxsize=32)
+def _index_sums(length: int):
+    # x = 0..length-1 y x² se calculan una vez por largo de ventana.
     np = _np()
-    if not closes or len(closes) < 10:
+    x = np.arange(length, dtype=float)
+    return x, x * x
+
+@telemetry.timed("ml.forecast_batch")
+def forecast_batch(series) -> List[Optional[float]]:
+    """
+    Proyecta el siguiente cierre de muchas series a la vez con la recta de mínimos
+    cuadrados sobre x = 0..n-1, evaluada en x = n (lo mismo que LinearRegression).
+    Los NaN intermedios (huecos) se omiten del ajuste pero conservan su posición:
+    la recta usa el índice real de cada punto válido y se evalúa en el índice
+    siguiente al último punto válido.
+
+    series: lista de listas de cierres (largos distintos) o matriz (series × tiempo)
+    con las series alineadas a la izquierda y NaN de relleno al final.
+    """
+    np = _np()
+    if isinstance(series, np.ndarray) and series.ndim == 2:
+        Y = series.astype(float)
+    else:
+        rows = [np.asarray(s if s is not None else [], dtype=float) for s in series]
+        if not rows:
+            return []
+        Y = np.full((len(rows), max(len(r) for r in rows)), np.nan)
+        for i, r in enumerate(rows):
+            Y[i, :len(r)] = r
+    if Y.shape[0] == 0:
+        return []
+    if Y.shape[1] == 0:
+        return [None] * Y.shape[0]
+    mask = ~np.isnan(Y)
+    Yz = np.where(mask, Y, 0.0)
+    x, x2 = _index_sums(Y.shape[1])
+    n = mask.sum(axis=1).astype(float)
+    sx = mask @ x
+    sxx = mask @ x2
+    sy = Yz.sum(axis=1)
+    sxy = Yz @ x
+    # Próximo índice: uno después del último punto válido (el relleno final no cuenta).
+    nxt = Y.shape[1] - np.argmax(mask[:, ::-1], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercept = (sy - slope * sx) / n
+        pred = intercept + slope * nxt
+    return [
+        float(p) if k >= _MIN_FORECAST_POINTS and np.isfinite(p) else None
+        for p, k in zip(pred, n)
+    ]
+
+@telemetry.timed("ml.forecast_next_price")
+def forecast_next_price(closes: List[float]) -> Optional[float]:
+    if not closes or len(closes) < _MIN_FORECAST_POINTS:
         return None
-    n = len(closes)
-    X = np.arange(n).reshape(-1, 1)
-    y = np.array(closes, dtype=float)
-    skl = _try_import_sklearn()
     try:
-        if skl is not None:
-            lr = skl["LinearRegression"]()
-            lr.fit(X, y)
-            return float(lr.predict(np.array([[n]]))[0])
-        coeffs = np.polyfit(np.arange(n), y, deg=1)
-        return float(coeffs[0] * n + coeffs[1])
+        return forecast_batch([closes])[0]
     except Exception:
         return None
-
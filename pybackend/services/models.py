@@ -0,0 +1,153 @@
+import datetime as _dt
+import hashlib
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from pybackend.services import storage, telemetry
+from pybackend.services.cache import TTLCache
+from pybackend.services.catalog import load_universe
+from pybackend.services.finance import compute_metrics_bulk
+from pybackend.services.ml import fit_kmeans, predict_kmeans
+from pybackend.services.singleflight import SingleFlight
+
+# -----------------------------------------------------------------------------
+# Registro de modelos de clustering: el escalador y los centroides se ajustan una
+# vez por día hábil sobre el universo configurado (TIKPRED_UNIVERSE_FILE o
+# CATEGORIES, ver catalog.load_universe) y se guardan en
+# .data/models/<universo>/<día>-k<n>.json. Los requests sólo hacen `predict` con
+# ese modelo sobre los símbolos que pidan, así un mismo símbolo conserva su grupo
+# durante el día sin importar con qué otros símbolos se consulte.
+# -----------------------------------------------------------------------------
+
+# Los artefactos del día quedan en memoria; los de días anteriores expiran solos.
+# Un ajuste parcial (ver _MIN_COVERAGE) se guarda como fallo: se reintenta a los
+# TIKPRED_MODEL_RETRY segundos en vez de recalcular el universo en cada request.
+_MODELS = TTLCache("models", maxsize=int(os.environ.get("TIKPRED_MODEL_CACHE_SIZE", "256")),
+                   ttl=86400.0, negative_ttl=float(os.environ.get("TIKPRED_MODEL_RETRY", "300")))
+_FLIGHTS = SingleFlight()
+
+# Para persistir el modelo del día hacen falta métricas completas de al menos esta
+# fracción del universo (y nunca menos filas que clusters). Con menos (timeouts,
+# símbolos sin datos) el ajuste se usa provisoriamente y no se guarda.
+_MIN_COVERAGE = float(os.environ.get("TIKPRED_MODEL_MIN_COVERAGE", "0.8"))
+
+# Artefactos diarios que se conservan por universo y k.
+_KEEP_ARTIFACTS = int(os.environ.get("TIKPRED_MODEL_KEEP", "30"))
+
+def universe_id(symbols: Iterable[str]) -> str:
+    """Identificador estable del universo: hash del conjunto de símbolos (orden irrelevante)."""
+    norm = sorted({s.strip().upper() for s in symbols if s})
+    return hashlib.sha1(",".join(norm).encode("utf-8")).hexdigest()[:16]
+
+def trading_day(now: Optional[_dt.datetime] = None) -> str:
+    """Día hábil vigente (UTC); sábado y domingo usan el viernes anterior."""
+    day = (now or _dt.datetime.now(_dt.timezone.utc)).date()
+    while day.weekday() >= 5:
+        day -= _dt.timedelta(days=1)
+    return day.isoformat()
+
+def _artifact_path(universe: str, day: str, n_clusters: int) -> str:
+    return os.path.join(storage.DATA_DIR, "models", universe, f"{day}-k{n_clusters}.json")
+
+def _artifact_days(universe: str, n_clusters: int) -> List[str]:
+    folder = os.path.join(storage.DATA_DIR, "models", universe)
+    suffix = f"-k{n_clusters}.json"
+    try:
+        return sorted(f[:-len(suffix)] for f in os.listdir(folder) if f.endswith(suffix))
+    except OSError:
+        return []
+
+def _prune(universe: str, n_clusters: int) -> None:
+    for day in _artifact_days(universe, n_clusters)[:-_KEEP_ARTIFACTS]:
+        try:
+            os.remove(_artifact_path(universe, day, n_clusters))
+        except OSError:
+            pass
+
+def _previous_centroids(universe: str, day: str, n_clusters: int) -> Optional[List[List[float]]]:
+    """Centroides del artefacto más reciente anterior a `day` del mismo universo."""
+    for prev in reversed([d for d in _artifact_days(universe, n_clusters) if d < day]):
+        model = storage.read_json(_artifact_path(universe, prev, n_clusters))
+        if model and model.get("centroids"):
+            return model["centroids"]
+    return None
+
+def _complete_rows(rows: List[Dict[str, Any]]) -> int:
+    fields = ("returns", "volatility", "volume_avg")
+    return sum(1 for r in rows if all(r.get(f) is not None and r.get(f) == r.get(f) for f in fields))
+
+def _fit(
+    universe: str, day: str, n_clusters: int, symbols: List[str], rows: Optional[List[Dict[str, Any]]]
+) -> Optional[Dict[str, Any]]:
+    path = _artifact_path(universe, day, n_clusters)
+    model = storage.read_json(path)
+    if model:
+        _MODELS.set(path, model)
+        return model
+    if rows is None:
+        rows = compute_metrics_bulk(symbols)
+    # Sólo se arranca desde el modelo de días anteriores de este mismo universo.
+    init = _previous_centroids(universe, day, n_clusters)
+    fitted = fit_kmeans(rows, n_clusters, universe=universe, init_centroids=init)
+    if fitted is None:
+        return None
+    complete = _complete_rows(rows)
+    if complete < max(n_clusters, _MIN_COVERAGE * len(symbols)):
+        # Ajuste provisorio: no se guarda en disco y se recalcula pasado
+        # TIKPRED_MODEL_RETRY, cuando el universo quizás ya esté completo.
+        model = dict(fitted, version=f"{universe}@{day}-k{n_clusters}-partial", universe=universe,
+                     day=day, n_clusters=n_clusters, n_symbols=complete, partial=True)
+        _MODELS.set(path, model, ok=False)
+        return model
+    model = dict(fitted, version=f"{universe}@{day}-k{n_clusters}", universe=universe,
+                 day=day, n_clusters=n_clusters, n_symbols=complete)
+    try:
+        storage.write_json(path, model)
+        _prune(universe, n_clusters)
+    except Exception as e:
+        print(f"[ERROR] No se pudo guardar el modelo {model['version']}: {e}")
+    _MODELS.set(path, model)
+    return model
+
+@telemetry.timed("models.get_model")
+def get_model(
+    n_clusters: int = 3,
+    day: Optional[str] = None,
+    universe: Optional[str] = None,
+    rows: Optional[List[Dict[str, Any]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Modelo del día para el universo configurado (o el archivo `universe`):
+    memoria → disco → ajuste. `rows` son las métricas de ese universo si el
+    llamador ya las tiene (p. ej. el screener); si no, se calculan. Ajustes
+    concurrentes se colapsan en uno solo. Si las métricas cubren poco del
+    universo el modelo vuelve con `partial=True` y no queda fijado en disco.
+    """
+    symbols = load_universe(universe)
+    uid = universe_id(symbols)
+    day = day or trading_day()
+    path = _artifact_path(uid, day, n_clusters)
+    model = _MODELS.get(path)
+    if model is not None:
+        return model
+    norm = sorted({s.strip().upper() for s in symbols if s})
+    return _FLIGHTS.do(path, _fit, uid, day, n_clusters, norm, rows)
+
+def predict(model: Optional[Dict[str, Any]], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Etiqueta `rows` con el modelo y agrega la versión a cada fila."""
+    if not model:
+        return []
+    out = predict_kmeans(model, rows)
+    for r in out:
+        r["version"] = model["version"]
+    return out
+
+@telemetry.timed("models.cluster")
+def cluster(
+    rows: List[Dict[str, Any]],
+    n_clusters: int = 3,
+    universe: Optional[str] = None,
+    universe_rows: Optional[List[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """Etiqueta `rows` (cualquier subconjunto de símbolos) con el modelo del día."""
+    return predict(get_model(n_clusters, universe=universe, rows=universe_rows), rows)
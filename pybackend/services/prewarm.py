@@ -0,0 +1,148 @@
+import datetime as dt
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from pybackend.services import finance, models, ratelimit, sentiment, storage
+from pybackend.services.catalog import load_universe
+
+# -----------------------------------------------------------------------------
+# Pre-calentamiento en segundo plano: cada INTERVAL segundos recorre el universo
+# (TIKPRED_UNIVERSE_FILE o CATEGORIES) y refresca históricos, info y titulares
+# que vencen antes del próximo ciclo. Junto con el stale-while-revalidate de las
+# cachés, ningún request paga una descarga en frío durante el horario de mercado.
+# Con varios procesos (workers de uvicorn, sesiones de Streamlit) lo que vive en
+# disco (almacén de precios y modelo del día) lo refresca sólo el que tiene el
+# lock de DATA_DIR/prewarm.lock; los demás reintentan tomarlo cada ciclo. Info y
+# titulares viven en cachés en memoria de cada proceso, así que cada uno calienta
+# los suyos, pero los seguidores lo hacen con pocos hilos
+# (TIKPRED_PREWARM_FOLLOWER_WORKERS) para no multiplicar la ráfaga upstream.
+# -----------------------------------------------------------------------------
+
+_ENABLED = os.environ.get("TIKPRED_PREWARM", "1") not in ("0", "false", "no")
+_INTERVAL = float(os.environ.get("TIKPRED_PREWARM_INTERVAL", "300"))
+# Fuera del horario de mercado (aprox. 13:00-21:00 UTC, lunes a viernes) sólo se
+# hace el primer ciclo, salvo TIKPRED_PREWARM_ALWAYS=1.
+_ALWAYS = os.environ.get("TIKPRED_PREWARM_ALWAYS", "0") in ("1", "true", "yes")
+_FOLLOWER_WORKERS = int(os.environ.get("TIKPRED_PREWARM_FOLLOWER_WORKERS", "2"))
+
+def _market_hours(now: Optional[dt.datetime] = None) -> bool:
+    now = now or dt.datetime.now(dt.timezone.utc)
+    return now.weekday() < 5 and 13 <= now.hour < 21
+
+class Prewarmer:
+    def __init__(self, universe: Optional[str] = None, interval: float = _INTERVAL):
+        self.universe = universe
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.cycles = 0
+        self.last: Dict[str, float] = {}
+        self._lock_fh = None
+
+    def _is_leader(self) -> bool:
+        if self._lock_fh is not None:
+            return True
+        try:
+            fh = open(storage.data_path("prewarm.lock"), "a+")
+        except OSError as e:
+            print(f"[ERROR] No se pudo abrir el lock de pre-calentamiento: {e}")
+            return False
+        if storage.lock_file(fh, blocking=False):
+            self._lock_fh = fh
+            return True
+        fh.close()
+        return False
+
+    def _release(self) -> None:
+        if self._lock_fh is not None:
+            self._lock_fh.close()
+            self._lock_fh = None
+
+    def run_once(self, leader: bool = True) -> Dict[str, float]:
+        """
+        Un ciclo: refresca lo que vence dentro de 1.5 intervalos. Retorna conteos.
+        Sin `leader` sólo se calientan las cachés en memoria de este proceso.
+        """
+        started = time.monotonic()
+        horizon = self.interval * 1.5
+        symbols: List[str] = load_universe(self.universe)
+        hist = 0
+        if leader:
+            hist = finance.refresh_history(symbols, period="90d", horizon=horizon)
+            try:
+                # El modelo de clustering del día se ajusta acá, no en el primer request.
+                models.get_model(universe=self.universe)
+            except Exception as e:
+                print(f"[ERROR] No se pudo ajustar el modelo del día: {e}")
+        limit = ratelimit.limiter("yahoo").max_concurrency if leader else _FOLLOWER_WORKERS
+        workers = max(1, min(limit, len(symbols)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prewarm") as ex:
+            info = sum(ex.map(lambda s: _safe(finance.refresh_info, s, horizon), symbols))
+            news = sum(ex.map(lambda s: _safe(sentiment.refresh_headlines, s, 24, horizon), symbols))
+        self.cycles += 1
+        self.last = {
+            "symbols": float(len(symbols)),
+            "history": float(hist),
+            "info": float(info),
+            "headlines": float(news),
+            "seconds": time.monotonic() - started,
+            "leader": float(leader),
+        }
+        return self.last
+
+    def _loop(self) -> None:
+        first = True
+        while not self._stop.is_set():
+            if first or _ALWAYS or _market_hours():
+                try:
+                    self.run_once(leader=self._is_leader())
+                except Exception as e:
+                    print(f"[ERROR] Fallo el ciclo de pre-calentamiento: {e}")
+                first = False
+            self._stop.wait(self.interval)
+        self._release()
+
+    def start(self) -> bool:
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+def _safe(fn, *args) -> bool:
+    try:
+        return bool(fn(*args))
+    except Exception as e:
+        print(f"[ERROR] Fallo el pre-calentamiento de {args[0]}: {e}")
+        return False
+
+_PREWARMER: Optional[Prewarmer] = None
+_LOCK = threading.Lock()
+
+def start(universe: Optional[str] = None) -> Optional[Prewarmer]:
+    """
+    Arranca el scheduler una sola vez por proceso (idempotente: Streamlit vuelve
+    a ejecutar el script en cada interacción). Retorna None si está deshabilitado.
+    """
+    global _PREWARMER
+    if not _ENABLED:
+        return None
+    with _LOCK:
+        if _PREWARMER is None:
+            _PREWARMER = Prewarmer(universe)
+        _PREWARMER.start()
+        return _PREWARMER
+
+def stop() -> None:
+    with _LOCK:
+        if _PREWARMER is not None:
+            _PREWARMER.stop(timeout=5.0)
@@ -0,0 +1,431 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+from pybackend.services import storage
+
+# -----------------------------------------------------------------------------
+# Capa de proveedores de datos de mercado: histórico, info y noticias detrás de
+# una interfaz común. LiveProvider usa las fuentes reales (yfinance, Stooq,
+# Google News, scrape de Yahoo); RecordingProvider guarda lo que devuelve otro
+# proveedor; ReplayProvider sirve esas capturas desde disco con latencia
+# inyectada; SyntheticProvider genera datos deterministas para cualquier símbolo.
+# Así se puede perfilar el pipeline completo con costo de I/O realista, offline.
+#
+# Selección por TIKPRED_DATA_PROVIDER:
+#   live (por defecto) | record:<dir> | replay:<dir> | synthetic
+# La latencia de replay/synthetic se configura con TIKPRED_PROVIDER_LATENCY:
+#   "0.2" (todas las llamadas) o "history=0.3,info=0.1,news=0.4"
+# y TIKPRED_PROVIDER_JITTER (fracción aleatoria extra, por defecto 0.25).
+# -----------------------------------------------------------------------------
+
+def _pd():
+    import pandas as pd
+    return pd
+
+def _ts(value):
+    return None if value is None else _pd().Timestamp(value)
+
+class DataProvider(ABC):
+    """
+    Interfaz común. `history` recibe un `period` ("90d") o un rango [start, end)
+    y retorna un DataFrame OHLCV normalizado (índice "Date") o None; `info`
+    retorna los campos crudos o None; `news` una lista de titulares.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self._calls_lock = threading.Lock()
+
+    def _count(self, kind: str, n: int = 1) -> None:
+        with self._calls_lock:
+            self.calls[kind] += n
+
+    @abstractmethod
+    def history(self, symbol: str, period: Optional[str] = None, start=None, end=None):
+        ...
+
+    def history_many(self, symbols: List[str], period: Optional[str] = None, start=None, end=None) -> Dict[str, Any]:
+        out = {}
+        for s in symbols:
+            df = self.history(s, period=period, start=_ts(start), end=_ts(end))
+            if df is not None:
+                out[s] = df
+        return out
+
+    @abstractmethod
+    def info(self, symbol: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def news(self, symbol: str, lookback_hours: int = 24) -> List[str]:
+        ...
+
+    async def news_async(self, symbol: str, lookback_hours: int = 24) -> List[str]:
+        return await asyncio.to_thread(self.news, symbol, lookback_hours)
+
+class LiveProvider(DataProvider):
+    """Las fuentes reales; la implementación vive en finance.py y sentiment.py."""
+
+    name = "live"
+
+    def history(self, symbol, period=None, start=None, end=None):
+        from pybackend.services import finance
+        self._count("history")
+        return finance._live_history(symbol, period=period, start=start, end=end)
+
+    def history_many(self, symbols, period=None, start=None, end=None):
+        from pybackend.services import finance
+        self._count("history_many")
+        span = {k: v for k, v in (("period", period), ("start", start), ("end", end)) if v is not None}
+        return finance._live_download_many(symbols, **span)
+
+    def info(self, symbol):
+        from pybackend.services import finance
+        self._count("info")
+        return finance._live_info(symbol)
+
+    def news(self, symbol, lookback_hours=24):
+        from pybackend.services import sentiment
+        self._count("news")
+        return sentiment._live_headlines(symbol, lookback_hours)
+
+    async def news_async(self, symbol, lookback_hours=24):
+        from pybackend.services import sentiment
+        self._count("news")
+        return await sentiment._live_headlines_async(symbol, lookback_hours)
+
+# -----------------------------------------------------------------------------
+# Captura y reproducción
+# -----------------------------------------------------------------------------
+
+def _capture_dir(root: str, kind: str, symbol: str) -> str:
+    return os.path.join(root, kind, quote(symbol.upper(), safe=""))
+
+class RecordingProvider(DataProvider):
+    """
+    Envuelve otro proveedor y guarda cada respuesta en `root`. Los históricos
+    se combinan con lo ya capturado, así un delta no pisa la serie completa.
+    """
+
+    name = "record"
+
+    def __init__(self, root: str, inner: Optional[DataProvider] = None):
+        super().__init__()
+        self.root = root
+        self.inner = inner or LiveProvider()
+        self._lock = threading.Lock()
+
+    def _save_history(self, symbol: str, df) -> None:
+        if df is None or df.empty:
+            return
+        pd = _pd()
+        path = _capture_dir(self.root, "history", symbol) + ".csv"
+        with self._lock:
+            if os.path.exists(path):
+                old = pd.read_csv(path, index_col=0, parse_dates=True)
+                df = pd.concat([old, df])
+                df = df[~df.index.duplicated(keep="last")].sort_index()
+            storage.atomic_write(path, df.to_csv().encode("utf-8"))
+
+    def history(self, symbol, period=None, start=None, end=None):
+        self._count("history")
+        df = self.inner.history(symbol, period=period, start=start, end=end)
+        self._save_history(symbol, df)
+        return df
+
+    def history_many(self, symbols, period=None, start=None, end=None):
+        self._count("history_many")
+        out = self.inner.history_many(symbols, period=period, start=start, end=end)
+        for s, df in out.items():
+            self._save_history(s, df)
+        return out
+
+    def info(self, symbol):
+        self._count("info")
+        info = self.inner.info(symbol)
+        if info is not None:
+            storage.write_json(_capture_dir(self.root, "info", symbol) + ".json", info)
+        return info
+
+    def news(self, symbol, lookback_hours=24):
+        self._count("news")
+        titles = self.inner.news(symbol, lookback_hours)
+        self._save_news(symbol, titles)
+        return titles
+
+    async def news_async(self, symbol, lookback_hours=24):
+        self._count("news")
+        titles = await self.inner.news_async(symbol, lookback_hours)
+        self._save_news(symbol, titles)
+        return titles
+
+    def _save_news(self, symbol: str, titles: List[str]) -> None:
+        if titles:
+            storage.write_json(_capture_dir(self.root, "news", symbol) + ".json", {"titles": list(titles)})
+
+def _parse_latency(spec: str) -> Dict[str, float]:
+    spec = (spec or "").strip()
+    if not spec:
+        return {}
+    if "=" not in spec:
+        v = float(spec)
+        return {"history": v, "info": v, "news": v}
+    out = {}
+    for part in spec.split(","):
+        k, _, v = part.partition("=")
+        out[k.strip()] = float(v)
+    return out
+
+class _Latency:
+    """Demora inyectada por tipo de llamada, con jitter reproducible."""
+
+    def __init__(self, latency: Optional[Dict[str, float]] = None, jitter: Optional[float] = None, seed: int = 0):
+        self.latency = latency if latency is not None else _parse_latency(os.environ.get("TIKPRED_PROVIDER_LATENCY", ""))
+        self.jitter = float(os.environ.get("TIKPRED_PROVIDER_JITTER", "0.25")) if jitter is None else jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, kind: str) -> float:
+        base = self.latency.get(kind, 0.0)
+        if base <= 0:
+            return 0.0
+        with self._lock:
+            return base * (1.0 + self.jitter * self._rng.random())
+
+    def sleep(self, kind: str) -> None:
+        d = self.delay(kind)
+        if d:
+            time.sleep(d)
+
+    async def sleep_async(self, kind: str) -> None:
+        d = self.delay(kind)
+        if d:
+            await asyncio.sleep(d)
+
+def _slice(df, period: Optional[str], start, end):
+    """Recorta un histórico completo al `period` o al rango [start, end) pedido."""
+    if df is None or df.empty:
+        return None
+    pd = _pd()
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    elif period:
+        from pybackend.services.finance import _period_days
+        df = df[df.index >= pd.Timestamp.today().normalize() - pd.Timedelta(days=_period_days(period))]
+    if end is not None:
+        df = df[df.index < pd.Timestamp(end)]
+    return df if not df.empty else None
+
+class ReplayProvider(DataProvider):
+    """
+    Sirve capturas de RecordingProvider desde `root`. Con shift_dates, cada serie
+    se corre en el tiempo para que su última barra sea el último día hábil, así
+    las ventanas relativas a "hoy" siguen teniendo datos aunque la captura sea vieja.
+    """
+
+    name = "replay"
+
+    def __init__(self, root: str, latency: Optional[Dict[str, float]] = None,
+                 jitter: Optional[float] = None, shift_dates: bool = True):
+        super().__init__()
+        self.root = root
+        self.shift_dates = shift_dates
+        self._latency = _Latency(latency, jitter)
+        self._frames: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _frame(self, symbol: str):
+        key = symbol.upper()
+        if key in self._frames:
+            return self._frames[key]
+        pd = _pd()
+        path = _capture_dir(self.root, "history", symbol) + ".csv"
+        df = None
+        if os.path.exists(path):
+            df = pd.read_csv(path, index_col=0, parse_dates=True)
+            df.index = pd.to_datetime(df.index)
+            df.index.name = "Date"
+            if self.shift_dates and not df.empty:
+                last_bday = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=1)[0]
+                df.index = df.index + (last_bday - df.index[-1])
+        with self._lock:
+            self._frames[key] = df
+        return df
+
+    def history(self, symbol, period=None, start=None, end=None):
+        self._count("history")
+        self._latency.sleep("history")
+        return _slice(self._frame(symbol), period, start, end)
+
+    def history_many(self, symbols, period=None, start=None, end=None):
+        # Una descarga en lote cuesta una sola latencia, como el multi-ticker real.
+        self._count("history_many")
+        self._latency.sleep("history")
+        out = {}
+        for s in symbols:
+            df = _slice(self._frame(s), period, start, end)
+            if df is not None:
+                out[s] = df
+        return out
+
+    def info(self, symbol):
+        self._count("info")
+        self._latency.sleep("info")
+        return storage.read_json(_capture_dir(self.root, "info", symbol) + ".json") or None
+
+    def news(self, symbol, lookback_hours=24):
+        self._count("news")
+        self._latency.sleep("news")
+        return self._titles(symbol)
+
+    async def news_async(self, symbol, lookback_hours=24):
+        self._count("news")
+        await self._latency.sleep_async("news")
+        return self._titles(symbol)
+
+    def _titles(self, symbol: str) -> List[str]:
+        return list(storage.read_json(_capture_dir(self.root, "news", symbol) + ".json").get("titles") or [])
+
+_HEADLINE_TEMPLATES = [
+    "{s} beats estimates as revenue grows",
+    "{s} shares fall after weak guidance",
+    "{s} launches new AI product line",
+    "Analysts upgrade {s} on strong demand",
+    "{s} faces lawsuit over data practices",
+    "{s} announces partnership with major retailer",
+    "{s} misses expectations, stock drops",
+    "{s} hits record high amid market rally",
+]
+
+class SyntheticProvider(DataProvider):
+    """Datos deterministas por símbolo (semilla = hash del símbolo); sirve cualquier ticker."""
+
+    name = "synthetic"
+
+    def __init__(self, latency: Optional[Dict[str, float]] = None, jitter: Optional[float] = None,
+                 days: int = 400, seed: int = 0):
+        super().__init__()
+        self.days = days
+        self.seed = seed
+        self._latency = _Latency(latency, jitter, seed)
+
+    def _rng(self, symbol: str):
+        import numpy as np
+        return np.random.default_rng(zlib.crc32(symbol.upper().encode("utf-8")) ^ self.seed)
+
+    def _frame(self, symbol: str):
+        import numpy as np
+        pd = _pd()
+        rng = self._rng(symbol)
+        idx = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=self.days)
+        vol = rng.uniform(0.005, 0.04)
+        close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0.0003, vol, len(idx))))
+        spread = close * rng.uniform(0.0, vol, len(idx))
+        return pd.DataFrame({
+            "Open": close - spread / 2,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.lognormal(14, 0.5, len(idx)).round(),
+        }, index=pd.DatetimeIndex(idx, name="Date"))
+
+    def history(self, symbol, period=None, start=None, end=None):
+        self._count("history")
+        self._latency.sleep("history")
+        return _slice(self._frame(symbol), period, start, end)
+
+    def history_many(self, symbols, period=None, start=None, end=None):
+        self._count("history_many")
+        self._latency.sleep("history")
+        out = {}
+        for s in symbols:
+            df = _slice(self._frame(s), period, start, end)
+            if df is not None:
+                out[s] = df
+        return out
+
+    def info(self, symbol):
+        self._count("info")
+        self._latency.sleep("info")
+        rng = self._rng(symbol)
+        return {
+            "trailingPE": float(rng.uniform(5, 60)),
+            "beta": float(rng.uniform(0.3, 2.2)),
+            "marketCap": float(rng.lognormal(24, 1.5)),
+            "sector": ["Technology", "Energy", "Healthcare", "Financial Services"][int(rng.integers(4))],
+            "shortName": symbol.upper(),
+            "longName": f"{symbol.upper()} Corp.",
+        }
+
+    def _titles(self, symbol: str) -> List[str]:
+        rng = self._rng(symbol)
+        picks = rng.choice(len(_HEADLINE_TEMPLATES), size=5, replace=False)
+        return [_HEADLINE_TEMPLATES[i].format(s=symbol.upper()) for i in picks]
+
+    def news(self, symbol, lookback_hours=24):
+        self._count("news")
+        self._latency.sleep("news")
+        return self._titles(symbol)
+
+    async def news_async(self, symbol, lookback_hours=24):
+        self._count("news")
+        await self._latency.sleep_async("news")
+        return self._titles(symbol)
+
+# -----------------------------------------------------------------------------
+# Proveedor activo
+# -----------------------------------------------------------------------------
+
+def from_spec(spec: str) -> DataProvider:
+    kind, _, arg = (spec or "live").partition(":")
+    kind = kind.strip().lower()
+    if kind == "live":
+        return LiveProvider()
+    if kind == "synthetic":
+        return SyntheticProvider()
+    # Las capturas son compartidas entre modos: siempre bajo la raíz base.
+    root = arg or os.path.join(storage.BASE_DIR, "captures")
+    if kind == "record":
+        return RecordingProvider(root)
+    if kind == "replay":
+        return ReplayProvider(root)
+    raise ValueError(f"Proveedor de datos desconocido: {spec!r}")
+
+_PROVIDER: Optional[DataProvider] = None
+_LOCK = threading.Lock()
+
+def get_provider() -> DataProvider:
+    global _PROVIDER
+    if _PROVIDER is None:
+        with _LOCK:
+            if _PROVIDER is None:
+                provider = from_spec(os.environ.get("TIKPRED_DATA_PROVIDER", "live"))
+                storage.use_namespace(provider.name)
+                _PROVIDER = provider
+    return _PROVIDER
+
+def active_provider() -> Optional[DataProvider]:
+    """El proveedor activo, o None si todavía no se creó ninguno (no lo crea)."""
+    return _PROVIDER
+
+def set_provider(provider: DataProvider) -> DataProvider:
+    """
+    Reemplaza el proveedor activo y retorna el anterior. El almacén persistente
+    pasa al directorio del nuevo proveedor (ver storage.namespace_dir).
+    """
+    global _PROVIDER
+    with _LOCK:
+        old = _PROVIDER
+        storage.use_namespace(provider.name)
+        _PROVIDER = provider
+    return old
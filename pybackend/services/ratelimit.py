@@ -0,0 +1,193 @@
+import asyncio
+import os
+import time
+import random
+import threading
+from typing import Dict, Optional, Tuple
+
+from pybackend.services import telemetry
+
+# -----------------------------------------------------------------------------
+# Limitador por host: token bucket para el ritmo + concurrencia adaptativa AIMD.
+# Cada llamada exitosa sube el ritmo y la concurrencia de forma aditiva; un 429
+# o un error los recorta de forma multiplicativa (y un 429 además pausa el host).
+# -----------------------------------------------------------------------------
+
+# host -> (ritmo inicial req/s, ritmo máximo, concurrencia inicial, concurrencia máxima)
+_DEFAULTS: Dict[str, Tuple[float, float, float, int]] = {
+    "yahoo": (4.0, 20.0, 4.0, 16),
+    "stooq": (2.0, 8.0, 2.0, 8),
+    "google": (1.0, 4.0, 1.0, 4),
+}
+
+_MIN_RATE = 0.2
+_THROTTLE_COOLDOWN = 2.0
+_MAX_COOLDOWN = 60.0
+
+def _is_throttled(exc: BaseException) -> bool:
+    if getattr(exc, "code", None) == 429 or getattr(exc, "status_code", None) == 429:
+        return True
+    if "RateLimit" in type(exc).__name__:
+        return True
+    msg = str(exc)
+    return "429" in msg or "Too Many Requests" in msg or "Rate limited" in msg
+
+class HostLimiter:
+    def __init__(self, host: str, rate: float, max_rate: float, concurrency: float, max_concurrency: int):
+        self.host = host
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self._rate = rate
+        self._limit = concurrency
+        self._tokens = max(1.0, rate)
+        self._stamp = time.monotonic()
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._strikes = 0
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        # El bucket admite una ráfaga de ~1s al ritmo actual.
+        self._tokens = min(max(1.0, self._rate), self._tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+
+    def _try_acquire(self) -> Tuple[bool, Optional[float]]:
+        # Requiere self._cond tomado. Si no hay slot, dice cuánto esperar
+        # (None = hasta que alguien libere uno).
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._blocked_until:
+            return False, self._blocked_until - now
+        if self._in_flight >= max(1, int(self._limit)):
+            return False, None
+        if self._tokens < 1.0:
+            return False, (1.0 - self._tokens) / self._rate
+        self._tokens -= 1.0
+        self._in_flight += 1
+        return True, None
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                ok, wait = self._try_acquire()
+                if ok:
+                    return
+                self._cond.wait(wait)
+
+    async def acquire_async(self) -> None:
+        # Sin bloquear el event loop: se reintenta tras dormir con asyncio.
+        while True:
+            with self._cond:
+                ok, wait = self._try_acquire()
+            if ok:
+                return
+            await asyncio.sleep(0.05 if wait is None else min(wait, 1.0))
+
+    def release(self, ok: bool = True, throttled: bool = False) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if ok:
+                self._strikes = 0
+                self._rate = min(self.max_rate, self._rate + 0.1)
+                self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+            elif throttled:
+                self._strikes += 1
+                self._rate = max(_MIN_RATE, self._rate * 0.5)
+                self._limit = max(1.0, self._limit * 0.5)
+                cooldown = min(_MAX_COOLDOWN, _THROTTLE_COOLDOWN * (2 ** (self._strikes - 1)))
+                self._blocked_until = max(self._blocked_until, time.monotonic() + cooldown)
+            else:
+                self._rate = max(_MIN_RATE, self._rate * 0.8)
+                self._limit = max(1.0, self._limit * 0.8)
+            self._cond.notify_all()
+
+    def slot(self) -> "_Slot":
+        return _Slot(self)
+
+    def backoff(self, attempt: int) -> None:
+        """Espera entre reintentos: exponencial con jitter, respetando la pausa del host."""
+        telemetry.inc("tikpred_upstream_retries_total", host=self.host)
+        delay = 0.25 * (2 ** attempt) * (0.5 + random.random())
+        with self._cond:
+            delay = max(delay, self._blocked_until - time.monotonic())
+        time.sleep(max(0.0, delay))
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "rate": self._rate,
+                "concurrency": self._limit,
+                "in_flight": float(self._in_flight),
+                "blocked_for": max(0.0, self._blocked_until - time.monotonic()),
+            }
+
+class _Slot:
+    """
+    Context manager (sync o async) de una llamada upstream. Una excepción cuenta
+    como error (o 429 si lo parece); `fail()` marca como error una respuesta
+    vacía que no lanzó excepción, como los DataFrames vacíos de yfinance.
+    También registra la espera por el slot, la duración y el resultado por host.
+    """
+
+    def __init__(self, limiter: HostLimiter):
+        self._limiter = limiter
+        self._ok = True
+        self._throttled = False
+        self._t0 = 0.0
+
+    def fail(self, throttled: bool = False) -> None:
+        self._ok = False
+        self._throttled = self._throttled or throttled
+
+    def _started(self, requested: float) -> None:
+        self._t0 = time.perf_counter()
+        telemetry.observe("tikpred_upstream_wait_seconds", self._t0 - requested, host=self._limiter.host)
+
+    def __enter__(self) -> "_Slot":
+        requested = time.perf_counter()
+        self._limiter.acquire()
+        self._started(requested)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None:
+            self.fail(_is_throttled(exc))
+        self._limiter.release(ok=self._ok, throttled=self._throttled)
+        host = self._limiter.host
+        outcome = "ok" if self._ok else ("throttled" if self._throttled else "error")
+        telemetry.observe("tikpred_upstream_seconds", time.perf_counter() - self._t0, host=host)
+        telemetry.inc("tikpred_upstream_calls_total", host=host, outcome=outcome)
+        return False
+
+    async def __aenter__(self) -> "_Slot":
+        requested = time.perf_counter()
+        await self._limiter.acquire_async()
+        self._started(requested)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        return self.__exit__(exc_type, exc, tb)
+
+_LIMITERS: Dict[str, HostLimiter] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def limiter(host: str) -> HostLimiter:
+    lim = _LIMITERS.get(host)
+    if lim is not None:
+        return lim
+    with _REGISTRY_LOCK:
+        lim = _LIMITERS.get(host)
+        if lim is None:
+            rate, max_rate, conc, max_conc = _DEFAULTS.get(host, (2.0, 8.0, 2.0, 8))
+            env = host.upper()
+            rate = float(os.environ.get(f"TIKPRED_RATE_{env}", rate))
+            max_rate = float(os.environ.get(f"TIKPRED_MAX_RATE_{env}", max(max_rate, rate)))
+            max_conc = int(os.environ.get(f"TIKPRED_MAX_CONCURRENCY_{env}", max_conc))
+            lim = HostLimiter(host, rate, max_rate, min(conc, float(max_conc)), max_conc)
+            _LIMITERS[host] = lim
+        return lim
+
+def limiters() -> Dict[str, HostLimiter]:
+    """Copia del registro de limitadores creados hasta ahora (host -> limitador)."""
+    with _REGISTRY_LOCK:
+        return dict(_LIMITERS)
@@ -1,29 +1,47 @@
-from typing import Dict, Any
-from pybackend.services.finance import get_ticker_info, get_historical, compute_metrics
-from pybackend.services.ml import forecast_next_price
-from pybackend.services.sentiment import fetch_headlines, sentiment_score, generate_reason
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from pybackend.services import fanout, telemetry
+from pybackend.services.finance import get_ticker_info, get_historical, get_historical_many, compute_metrics, slice_period
+from pybackend.services.metrics import compute_metrics_frames
+from pybackend.services.ml import forecast_batch, forecast_next_price
+from pybackend.services.sentiment import fetch_headlines, sentiment_score, sentiment_scores, generate_reason
 from pybackend.services.similarity import find_similar_stocks
 
-def recommend_for_symbol(symbol: str) -> Dict[str, Any]:
-    info = get_ticker_info(symbol)
-    dfh = get_historical(symbol, period="70d")
-    last_close = None
-    closes = []
-    if dfh is not None and not dfh.empty:
-        last_close = float(dfh["Close"].tail(1).values[0])
-        closes = [float(x) for x in dfh["Close"].tail(60).tolist()]
-    forecast = forecast_next_price(closes)
+# Campos de la respuesta que quedan en null si su fuente vence el deadline.
+_RECO_FIELDS = {
+    "info": ["info"],
+    "history": ["lastClose", "forecast", "direction"],
+    "metrics": ["metrics"],
+    "headlines": ["sentiment", "external_reason"],
+}
+
+# recommend_many lanza 2N+1 llamadas; van a un pool propio y acotado para que un
+# lote grande no deje sin hilos al fan-out compartido de /quotes. El deadline se
+# estira por cada "ronda" de llamadas que el pool necesita para vaciar el lote.
+_BATCH_WORKERS = int(os.environ.get("TIKPRED_RECOMMEND_WORKERS", "16"))
+_BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=_BATCH_WORKERS, thread_name_prefix="recommend")
+
+def _build(
+    symbol: str,
+    info: Optional[Dict[str, Any]],
+    last_close: Optional[float],
+    forecast: Optional[float],
+    metrics: Optional[Dict[str, Any]],
+    sent: Optional[float],
+    ext_reason: Optional[str],
+    timed_out: List[str],
+) -> Dict[str, Any]:
     change = None
     direction = "Neutral"
     if forecast is not None and last_close is not None:
         change = float(forecast) - float(last_close)
         direction = "Sube" if change > 0 else "Baja" if change < 0 else "Neutral"
-    metrics = compute_metrics(symbol)
-    headlines = fetch_headlines(symbol)
-    sent = sentiment_score(headlines)
-    ext_reason = generate_reason(headlines)
-    pe = info.get("trailingPE")
-    beta = info.get("beta")
+    elif "direction" in timed_out:
+        # Sin histórico a tiempo no hay dirección: null, coherente con timedOut.
+        direction = None
+    pe = (info or {}).get("trailingPE")
+    beta = (info or {}).get("beta")
     internal_reason = None
     if pe is not None and pe <= 15:
         internal_reason = "Valuación atractiva por múltiplos bajos"
@@ -58,8 +76,83 @@ def recommend_for_symbol(symbol: str) -> Dict[str, Any]:
         "metrics": metrics,
         "info": info,
         "sentiment": sent,
+        "timedOut": timed_out,
     }
 
+def _closes(dfh) -> List[float]:
+    if dfh is None or dfh.empty:
+        return []
+    return [float(x) for x in dfh["Close"].tail(60).tolist()]
+
+@telemetry.timed("recommender.recommend_for_symbol")
+def recommend_for_symbol(symbol: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+    res, missed = fanout.gather({
+        "info": (get_ticker_info, symbol),
+        "history": (get_historical, symbol, "70d"),
+        "metrics": (compute_metrics, symbol),
+        "headlines": (fetch_headlines, symbol),
+    }, deadline)
+    closes = _closes(res["history"])
+    last_close = closes[-1] if closes else None
+    headlines = res["headlines"]
+    sent = sentiment_score(headlines) if headlines is not None else None
+    ext_reason = generate_reason(headlines) if headlines is not None else None
+    return _build(symbol, res["info"], last_close, forecast_next_price(closes), res["metrics"],
+                  sent, ext_reason, fanout.timed_out_fields(missed, _RECO_FIELDS))
+
+@telemetry.timed("recommender.history_and_metrics")
+def _history_and_metrics(symbols: List[str]) -> Dict[str, Any]:
+    # Una sola descarga por lotes sirve a los dos recortes: 70d para el
+    # pronóstico y 60d (recorte de la misma ventana) para las métricas.
+    hist = get_historical_many(symbols, "70d")
+    frames = {}
+    for s, df in hist.items():
+        tail = slice_period(df, "60d")
+        if tail is not None:
+            frames[s] = tail
+    metrics = {m["symbol"]: m for m in compute_metrics_frames(symbols, frames)}
+    return {"history": hist, "metrics": metrics}
+
+@telemetry.timed("recommender.recommend_many")
+def recommend_many(symbols: List[str], deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Igual que recommend_for_symbol para varios símbolos, compartiendo las
+    descargas: históricos en lote, info y titulares en paralelo, y pronóstico y
+    sentimiento vectorizados. El resultado sirve directo como pool de
+    find_similar_stocks / SimilarityIndex.from_pool.
+    """
+    uniq = list(dict.fromkeys(symbols))
+    if not uniq:
+        return []
+    calls: Dict[str, Any] = {"history": (_history_and_metrics, uniq)}
+    for s in uniq:
+        calls[f"info:{s}"] = (get_ticker_info, s)
+        calls[f"headlines:{s}"] = (fetch_headlines, s)
+    rounds = -(-len(calls) // _BATCH_WORKERS)
+    budget = (fanout.DEFAULT_DEADLINE if deadline is None else deadline) * max(1, rounds)
+    res, missed = fanout.gather(calls, budget, executor=_BATCH_EXECUTOR)
+    hm = res["history"] or {"history": {}, "metrics": {}}
+    closes = [_closes(hm["history"].get(s)) for s in uniq]
+    forecasts = forecast_batch(closes)
+    headlines = {s: res[f"headlines:{s}"] for s in uniq}
+    sents = sentiment_scores({s: h for s, h in headlines.items() if h is not None})
+    out = {}
+    for s, c, f in zip(uniq, closes, forecasts):
+        h = headlines[s]
+        sym_missed = [
+            name for name, key in (("history", "history"), ("metrics", "history"),
+                                   ("info", f"info:{s}"), ("headlines", f"headlines:{s}"))
+            if key in missed
+        ]
+        out[s] = _build(
+            s, res[f"info:{s}"], c[-1] if c else None, f, hm["metrics"].get(s),
+            sents.get(s) if h is not None else None,
+            generate_reason(h) if h is not None else None,
+            fanout.timed_out_fields(sym_missed, _RECO_FIELDS),
+        )
+    return [out[s] for s in symbols]
+
+@telemetry.timed("recommender.recommend_similar_stocks")
 def recommend_similar_stocks(symbol: str, pool_data: list, k: int = 5):
     """
     Wrapper para encontrar acciones similares usando el módulo de similaridad.
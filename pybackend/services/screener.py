@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, TextIO
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from pybackend.services import models
+from pybackend.services.catalog import iter_universe
+from pybackend.services.finance import compute_metrics_bulk
+
+# -----------------------------------------------------------------------------
+# Screener por lotes para universos grandes: un hilo productor baja históricos y
+# calcula métricas de a un bloque de símbolos; una cola acotada frena al
+# productor si la escritura se atrasa, así en memoria sólo viven unos pocos
+# bloques de DataFrames. Cada bloque se escribe como NDJSON apenas está listo;
+# al final se ajusta el clustering sobre las features (3 floats por símbolo)
+# y se emiten las filas con su grupo.
+# -----------------------------------------------------------------------------
+
+_DONE = object()
+
+def _put(q: "queue.Queue", item: Any, stop: threading.Event) -> bool:
+    # put con timeout para que el productor no quede colgado si el consumidor abandona.
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _produce(chunks: Iterable[List[str]], q: "queue.Queue", stop: threading.Event) -> None:
+    try:
+        for chunk in chunks:
+            try:
+                rows = compute_metrics_bulk(chunk)
+            except Exception as e:
+                print(f"[ERROR] Fallo el bloque {chunk[0]}..{chunk[-1]}: {e}")
+                rows = [{"symbol": s, "returns": None, "volatility": None, "volume_avg": None} for s in chunk]
+            if not _put(q, rows, stop):
+                return
+    except Exception as e:
+        _put(q, e, stop)
+    _put(q, _DONE, stop)
+
+def _emit(out: TextIO, obj: Dict[str, Any]) -> None:
+    out.write(json.dumps(obj, separators=(",", ":")) + "\n")
+
+def screen(
+    out: TextIO,
+    universe: Optional[str] = None,
+    chunk_size: int = 200,
+    queue_size: int = 2,
+    n_clusters: int = 3,
+) -> Dict[str, Any]:
+    """
+    Escribe en `out` una línea {"type": "metrics", ...} por símbolo a medida que
+    avanza y, al terminar, una línea {"type": "cluster", ...} por símbolo con
+    datos completos más un {"type": "summary", ...}. Retorna el resumen.
+    """
+    started = time.monotonic()
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=_produce,
+        args=(iter_universe(universe, chunk_size), q, stop),
+        name="screener-fetch",
+        daemon=True,
+    )
+    producer.start()
+    features: List[Dict[str, Any]] = []
+    symbols: List[str] = []
+    n_chunks = 0
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            n_chunks += 1
+            for row in item:
+                symbols.append(row["symbol"])
+                _emit(out, dict(row, type="metrics"))
+                if row.get("returns") is not None and row.get("volatility") is not None and row.get("volume_avg") is not None:
+                    features.append(row)
+            out.flush()
+    finally:
+        stop.set()
+        producer.join()
+    clusters = models.cluster(features, n_clusters, universe=universe, universe_rows=features) if features else []
+    for row in clusters:
+        _emit(out, dict(row, type="cluster"))
+    summary = {
+        "type": "summary",
+        "symbols": len(symbols),
+        "complete": len(features),
+        "chunks": n_chunks,
+        "version": clusters[0]["version"] if clusters else None,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    _emit(out, summary)
+    out.flush()
+    return summary
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Screener de mercado por lotes (salida NDJSON).")
+    p.add_argument("--universe", help="archivo de símbolos (txt o csv); por defecto TIKPRED_UNIVERSE_FILE o el catálogo")
+    p.add_argument("--out", default="-", help="archivo NDJSON de salida ('-' = stdout)")
+    p.add_argument("--chunk", type=int, default=200, help="símbolos por bloque")
+    p.add_argument("--queue", type=int, default=2, help="bloques en espera antes de frenar la descarga")
+    p.add_argument("--clusters", type=int, default=3)
+    args = p.parse_args(argv)
+    if args.out == "-":
+        summary = screen(sys.stdout, args.universe, args.chunk, args.queue, args.clusters)
+    else:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            summary = screen(fh, args.universe, args.chunk, args.queue, args.clusters)
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,33 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
+import asyncio
+import os
 import re
+import threading
+import time
 import datetime as dt
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pybackend.services import httpclient, providers, ratelimit, telemetry
+from pybackend.services.cache import TTLCache
+from pybackend.services.memo import ContentMemo, text_key
+from pybackend.services.singleflight import SingleFlight
+
+# Llamadas concurrentes por el mismo símbolo comparten una sola búsqueda de noticias.
+_FLIGHTS = SingleFlight()
+
+# Titulares por símbolo; una búsqueda vacía se reintenta pronto.
+_HEADLINE_CACHE = TTLCache(
+    "headlines",
+    maxsize=int(os.environ.get("TIKPRED_HEADLINES_CACHE_SIZE", "2048")),
+    ttl=float(os.environ.get("TIKPRED_HEADLINES_TTL", "900")),
+    negative_ttl=float(os.environ.get("TIKPRED_NEGATIVE_TTL", "60")),
+    # Vencidos se siguen sirviendo este tiempo mientras se refrescan en segundo plano.
+    stale_ttl=float(os.environ.get("TIKPRED_STALE_TTL", "3600")),
+)
+
+# Puntajes y motivos por titular, persistidos por hash del texto normalizado:
+# un titular ya visto (en cualquier símbolo) no se vuelve a analizar.
+_MEMO = ContentMemo("sentiment_memo")
 
 def _try_import_googlenews():
     try:
@@ -16,119 +43,380 @@ def _try_import_vader():
     except Exception:
         return None
 
+def _cached_headlines(key: str, symbol: str, lookback_hours: int):
+    cached, stale = _HEADLINE_CACHE.get_stale(key)
+    if stale:
+        _FLIGHTS.do_background(key, _fill_headlines, key, symbol, lookback_hours)
+    return cached
+
+@telemetry.timed("sentiment.fetch_headlines")
 def fetch_headlines(symbol: str, lookback_hours: int = 24) -> List[str]:
-    # 1. Estrategia Principal: yfinance (API oficial/no oficial robusta)
+    key = f"news:{symbol}:{lookback_hours}"
+    cached = _cached_headlines(key, symbol, lookback_hours)
+    if cached is not None:
+        return list(cached)
+    return list(_FLIGHTS.do(key, _fill_headlines, key, symbol, lookback_hours))
+
+@telemetry.timed("sentiment.fetch_headlines_async")
+async def fetch_headlines_async(symbol: str, lookback_hours: int = 24) -> List[str]:
+    key = f"news:{symbol}:{lookback_hours}"
+    cached = _cached_headlines(key, symbol, lookback_hours)
+    if cached is not None:
+        return list(cached)
+    return list(await _FLIGHTS.do_async(key, _fill_headlines_async, key, symbol, lookback_hours))
+
+@telemetry.timed("sentiment.fill_headlines")
+def _fill_headlines(key: str, symbol: str, lookback_hours: int) -> List[str]:
+    titles = providers.get_provider().news(symbol, lookback_hours)
+    _HEADLINE_CACHE.set(key, tuple(titles), ok=bool(titles))
+    return titles
+
+@telemetry.timed("sentiment.refresh_headlines")
+def refresh_headlines(symbol: str, lookback_hours: int = 24, horizon: float = 0.0) -> bool:
+    """
+    Vuelve a buscar los titulares si vencen dentro de `horizon` segundos (o no
+    están en caché). Pensado para el pre-calentamiento; retorna si refrescó.
+    """
+    key = f"news:{symbol}:{lookback_hours}"
+    left = _HEADLINE_CACHE.ttl_left(key)
+    if left is not None and left > horizon:
+        return False
+    _FLIGHTS.do(key, _fill_headlines, key, symbol, lookback_hours)
+    return True
+
+@telemetry.timed("sentiment.fill_headlines_async")
+async def _fill_headlines_async(key: str, symbol: str, lookback_hours: int) -> List[str]:
+    titles = await providers.get_provider().news_async(symbol, lookback_hours)
+    _HEADLINE_CACHE.set(key, tuple(titles), ok=bool(titles))
+    return titles
+
+# Modo de consulta de fuentes de noticias, configurable por despliegue:
+#   sequential: una fuente tras otra (comportamiento original)
+#   hedged: arranca la siguiente fuente si la actual no respondió en HEDGE_DELAY
+#   race: arranca todas a la vez
+# En hedged/race gana el primer resultado no vacío dentro de BUDGET segundos.
+_HEADLINES_MODE = os.environ.get("TIKPRED_HEADLINES_MODE", "hedged").lower()
+_HEDGE_DELAY = float(os.environ.get("TIKPRED_HEADLINES_HEDGE_DELAY", "1.0"))
+_HEADLINES_BUDGET = float(os.environ.get("TIKPRED_HEADLINES_BUDGET", "6.0"))
+
+_NEWS_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("TIKPRED_NEWS_WORKERS", "16")),
+                                thread_name_prefix="news")
+
+def _sync_sources():
+    return [_news_yfinance, _news_google, _news_yahoo_scrape]
+
+def _live_headlines(symbol: str, lookback_hours: int = 24) -> List[str]:
+    if _HEADLINES_MODE == "sequential":
+        for source in _sync_sources():
+            titles = source(symbol)
+            if titles:
+                return titles
+            telemetry.inc("tikpred_fallbacks_total", path="headlines", source="empty")
+        return []
+    delay = 0.0 if _HEADLINES_MODE == "race" else _HEDGE_DELAY
+    return _hedged(symbol, _sync_sources(), delay, _HEADLINES_BUDGET)
+
+def _hedged(symbol: str, sources, delay: float, budget: float) -> List[str]:
+    """
+    Lanza las fuentes en orden de prioridad, una más cada `delay` segundos o
+    apenas la anterior termine vacía. Retorna el primer resultado no vacío.
+    Las fuentes que aún no arrancaron se cancelan; las que ya corren en un hilo
+    no se pueden interrumpir y su resultado simplemente se descarta.
+    """
+    deadline = time.monotonic() + budget
+    queue = list(sources)
+    pending = set()
+    next_launch = time.monotonic()
     try:
-        import yfinance as yf
-        tick = yf.Ticker(symbol)
-        news = tick.news
-        if news:
-            titles = []
-            for n in news:
-                # Soporte para estructura nueva y vieja de yfinance
-                t = n.get('title')
-                if not t and 'content' in n:
-                    t = n['content'].get('title')
-                if t:
-                    titles.append(t)
+        while queue or pending:
+            now = time.monotonic()
+            if now >= deadline:
+                print(f"[ERROR] Noticias de {symbol}: presupuesto de {budget}s agotado")
+                telemetry.inc("tikpred_fallbacks_total", path="headlines", source="budget")
+                return []
+            if queue and (now >= next_launch or not pending):
+                pending.add(_NEWS_POOL.submit(queue.pop(0), symbol))
+                next_launch = now + delay
+                continue
+            until = min(deadline, next_launch) if queue else deadline
+            done, _ = wait(pending, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                pending.discard(fut)
+                titles = fut.result()
+                if titles:
+                    return titles
+                telemetry.inc("tikpred_fallbacks_total", path="headlines", source="empty")
+                # Una fuente vacía no espera el delay: se pasa a la siguiente ya.
+                next_launch = time.monotonic()
+        return []
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+async def _live_headlines_async(symbol: str, lookback_hours: int = 24) -> List[str]:
+    # yfinance y GoogleNews sólo tienen API síncrona: corren en un hilo.
+    sources = [
+        lambda: asyncio.to_thread(_news_yfinance, symbol),
+        lambda: asyncio.to_thread(_news_google, symbol),
+        lambda: _news_yahoo_scrape_async(symbol),
+    ]
+    if _HEADLINES_MODE == "sequential":
+        for source in sources:
+            titles = await source()
             if titles:
                 return titles
+            telemetry.inc("tikpred_fallbacks_total", path="headlines", source="empty")
+        return []
+    delay = 0.0 if _HEADLINES_MODE == "race" else _HEDGE_DELAY
+    return await _hedged_async(symbol, sources, delay, _HEADLINES_BUDGET)
+
+async def _hedged_async(symbol: str, sources, delay: float, budget: float) -> List[str]:
+    """Igual que `_hedged`, pero las fuentes nativas async sí se cancelan de verdad."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + budget
+    queue = list(sources)
+    pending = set()
+    next_launch = loop.time()
+    try:
+        while queue or pending:
+            now = loop.time()
+            if now >= deadline:
+                print(f"[ERROR] Noticias de {symbol}: presupuesto de {budget}s agotado")
+                telemetry.inc("tikpred_fallbacks_total", path="headlines", source="budget")
+                return []
+            if queue and (now >= next_launch or not pending):
+                pending.add(asyncio.ensure_future(queue.pop(0)()))
+                next_launch = now + delay
+                continue
+            until = min(deadline, next_launch) if queue else deadline
+            done, _ = await asyncio.wait(pending, timeout=max(0.0, until - now), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                titles = task.result()
+                if titles:
+                    return titles
+                telemetry.inc("tikpred_fallbacks_total", path="headlines", source="empty")
+                next_launch = loop.time()
+        return []
+    finally:
+        for task in pending:
+            task.cancel()
+
+# 1. Estrategia Principal: yfinance (API oficial/no oficial robusta)
+@telemetry.timed("sentiment.news_yfinance")
+def _news_yfinance(symbol: str) -> List[str]:
+    try:
+        import yfinance as yf
+        tick = yf.Ticker(symbol)
+        with ratelimit.limiter("yahoo").slot():
+            news = tick.news
+        titles = []
+        for n in news or []:
+            # Soporte para estructura nueva y vieja de yfinance
+            t = n.get('title')
+            if not t and 'content' in n:
+                t = n['content'].get('title')
+            if t:
+                titles.append(t)
+        return titles
     except Exception as e:
         print(f"[ERROR] yfinance news falló para {symbol}: {e}")
+        return []
 
-    # 2. Estrategia Secundaria: GoogleNews
+# 2. Estrategia Secundaria: GoogleNews
+@telemetry.timed("sentiment.news_google")
+def _news_google(symbol: str) -> List[str]:
     GN = _try_import_googlenews()
-    if GN is not None:
-        try:
-            # Intentar búsqueda en inglés también para stocks internacionales
-            gn = GN(lang='en', region='US') 
+    if GN is None:
+        return []
+    try:
+        # Intentar búsqueda en inglés también para stocks internacionales
+        gn = GN(lang='en', region='US') 
+        with ratelimit.limiter("google").slot():
             gn.search(f"{symbol} stock")
-            entries = gn.result()
-            if entries:
-                return [e.get('title') for e in entries if e.get('title')]
-        except Exception as e:
-            print(f"[ERROR] GoogleNews falló para {symbol}: {e}")
-            pass
-
-    # 3. Estrategia de Respaldo: Scraping directo (Yahoo Finance)
+        entries = gn.result()
+        return [e.get('title') for e in entries or [] if e.get('title')]
+    except Exception as e:
+        print(f"[ERROR] GoogleNews falló para {symbol}: {e}")
+        return []
+
+# 3. Estrategia de Respaldo: Scraping directo (Yahoo Finance)
+# verify=False: contexto SSL permisivo para evitar errores de certificados locales
+@telemetry.timed("sentiment.news_yahoo_scrape")
+def _news_yahoo_scrape(symbol: str) -> List[str]:
+    try:
+        with ratelimit.limiter("yahoo").slot():
+            html = httpclient.get_text(f"https://finance.yahoo.com/quote/{symbol}", "finance.yahoo.com",
+                                       timeout=5, verify=False)
+        return _parse_yahoo_titles(html)
+    except Exception as e:
+        print(f"[ERROR] Fallo fetch_headlines backup para {symbol}: {e}")
+        return []
+
+@telemetry.timed("sentiment.news_yahoo_scrape_async")
+async def _news_yahoo_scrape_async(symbol: str) -> List[str]:
     try:
-        import urllib.request
-        import ssl
-        import certifi
-        
-        # Contexto SSL permisivo para evitar errores de certificados locales
-        ctx = ssl.create_default_context(cafile=certifi.where())
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        req = urllib.request.Request(
-            f"https://finance.yahoo.com/quote/{symbol}",
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-        )
-        with urllib.request.urlopen(req, timeout=5, context=ctx) as response:
-            html = response.read().decode("utf-8", errors="ignore")
-        titles = re.findall(r'<h3[^>]*>(.*?)</h3>', html, flags=re.IGNORECASE)
-        clean = [re.sub('<[^<]+?>', '', t).strip() for t in titles]
-        return [t for t in clean if t and len(t) > 10]
+        async with ratelimit.limiter("yahoo").slot():
+            html = await httpclient.get_text_async(f"https://finance.yahoo.com/quote/{symbol}", "finance.yahoo.com",
+                                                   timeout=5, verify=False)
+        return _parse_yahoo_titles(html)
     except Exception as e:
         print(f"[ERROR] Fallo fetch_headlines backup para {symbol}: {e}")
         return []
 
+def _parse_yahoo_titles(html: str) -> List[str]:
+    titles = re.findall(r'<h3[^>]*>(.*?)</h3>', html, flags=re.IGNORECASE)
+    clean = [re.sub('<[^<]+?>', '', t).strip() for t in titles]
+    return [t for t in clean if t and len(t) > 10]
+
+# Fallback heurístico (Español e Inglés básico)
+_POS_WORDS = {"sube", "ganancia", "positivo", "alcista", "crece", "mejora", "supera", 
+              "up", "gain", "positive", "bullish", "growth", "improve", "beat", "rise", "high"}
+_NEG_WORDS = {"cae", "pérdida", "negativo", "bajista", "disminuye", "empeora", "falla", 
+              "down", "loss", "negative", "bearish", "drop", "worse", "miss", "fall", "low"}
+_POLARITY = {**{w: 1 for w in _POS_WORDS}, **{w: -1 for w in _NEG_WORDS}}
+# Una sola regex con todas las palabras: un recorrido por titular y respetando
+# límites de palabra ("up" ya no coincide dentro de "support").
+_LEXICON_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(w) for w in sorted(_POLARITY, key=len, reverse=True)) + r")\b"
+)
+
+def _lexicon_score(text: str) -> float:
+    found = set(_LEXICON_RE.findall(text.lower()))
+    p = sum(1 for w in found if _POLARITY[w] > 0)
+    n = len(found) - p
+    return (p - n) / max(p + n, 1)
+
+class SentimentEngine:
+    """
+    Motor de sentimiento del proceso: carga VADER una sola vez (o cae al léxico
+    compilado si no está instalado) y puntúa lotes de titulares de muchos
+    símbolos puntuando cada titular distinto una sola vez.
+    """
+
+    def __init__(self):
+        self._analyzer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _vader(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    V = _try_import_vader()
+                    try:
+                        self._analyzer = V() if V is not None else None
+                    except Exception:
+                        self._analyzer = None
+                    self._loaded = True
+        return self._analyzer
+
+    @property
+    def name(self) -> str:
+        return "vader" if self._vader() is not None else "lexicon"
+
+    def score_text(self, text: str) -> float:
+        analyzer = self._vader()
+        if analyzer is not None:
+            try:
+                return float(analyzer.polarity_scores(text).get('compound', 0.0))
+            except Exception:
+                pass
+        return _lexicon_score(text)
+
+    def score_many(self, texts: List[str]) -> Dict[str, float]:
+        """Puntaje por titular distinto; sólo se analizan los que no están en el memo."""
+        # "s2": las claves "s:" se calcularon sin distinguir mayúsculas y pueden
+        # tener el puntaje de otra variante del titular.
+        prefix = f"s2:{self.name}:"
+        keys = {t: prefix + text_key(t) for t in set(texts)}
+        known = _MEMO.get_many(keys.values())
+        cold = [t for t in keys if keys[t] not in known]
+        fresh: Dict[str, float] = {}
+        if cold:
+            with telemetry.span(f"sentiment.{self.name}"):
+                fresh = {keys[t]: self.score_text(t) for t in cold}
+        _MEMO.put_many(fresh)
+        known.update(fresh)
+        return {t: known[k] for t, k in keys.items()}
+
+    def score(self, texts: List[str]) -> Optional[float]:
+        if not texts:
+            return None
+        scored = self.score_many(texts)
+        return sum(scored[t] for t in texts) / len(texts)
+
+    def score_batch(self, groups: Dict[str, List[str]]) -> Dict[str, Optional[float]]:
+        scored = self.score_many([t for texts in groups.values() for t in texts or []])
+        return {
+            key: (sum(scored[t] for t in texts) / len(texts)) if texts else None
+            for key, texts in groups.items()
+        }
+
+_ENGINE: Optional[SentimentEngine] = None
+_ENGINE_LOCK = threading.Lock()
+
+def get_engine() -> SentimentEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        with _ENGINE_LOCK:
+            if _ENGINE is None:
+                _ENGINE = SentimentEngine()
+    return _ENGINE
+
+@telemetry.timed("sentiment.sentiment_score")
 def sentiment_score(texts: List[str]) -> Optional[float]:
-    if not texts:
-        return None
-    V = _try_import_vader()
-    if V is not None:
-        try:
-            analyzer = V()
-            scores = [analyzer.polarity_scores(t).get('compound', 0.0) for t in texts]
-            return sum(scores) / len(scores) if scores else None
-        except Exception:
-            pass
-    
-    # Fallback heurístico (Español e Inglés básico)
-    pos = {"sube", "ganancia", "positivo", "alcista", "crece", "mejora", "supera", 
-           "up", "gain", "positive", "bullish", "growth", "improve", "beat", "rise", "high"}
-    neg = {"cae", "pérdida", "negativo", "bajista", "disminuye", "empeora", "falla", 
-           "down", "loss", "negative", "bearish", "drop", "worse", "miss", "fall", "low"}
-    vals = []
-    for t in texts:
-        tl = t.lower()
-        p = sum(1 for w in pos if w in tl)
-        n = sum(1 for w in neg if w in tl)
-        s = (p - n) / max(p + n, 1)
-        vals.append(s)
-    return sum(vals) / len(vals) if vals else None
+    return get_engine().score(texts)
 
-def generate_reason(texts: List[str]) -> str:
-    if not texts:
-        return "Sin noticias relevantes recientes"
-    tl = " ".join(texts).lower()
-    
+@telemetry.timed("sentiment.sentiment_scores")
+def sentiment_scores(groups: Dict[str, List[str]]) -> Dict[str, Optional[float]]:
+    """Puntaje promedio por símbolo para {símbolo: titulares} en una sola llamada."""
+    return get_engine().score_batch(groups)
+
+# Motivos en orden de prioridad: gana el primero que aparezca en algún titular.
+_REASONS = [
     # IA / Tech
-    if any(w in tl for w in ["ai", "inteligencia artificial", "machine learning", "gpt", "generative", "chip", "nvidia"]):
-        return "Impulso por iniciativas de IA y tecnología"
-    
+    (["ai", "inteligencia artificial", "machine learning", "gpt", "generative", "chip", "nvidia"],
+     "Impulso por iniciativas de IA y tecnología"),
     # Productos
-    if any(w in tl for w in ["producto", "nuevo", "presenta", "lanza", "product", "new", "launch", "release", "unveil", "iphone", "mac"]):
-        return "Nuevos productos/servicios generan expectativa"
-    
+    (["producto", "nuevo", "presenta", "lanza", "product", "new", "launch", "release", "unveil", "iphone", "mac"],
+     "Nuevos productos/servicios generan expectativa"),
     # Alianzas
-    if any(w in tl for w in ["acuerdo", "alianza", "partnership", "deal", "merge", "acquisition", "compra"]):
-        return "Movimientos corporativos y alianzas estratégicas"
-    
+    (["acuerdo", "alianza", "partnership", "deal", "merge", "acquisition", "compra"],
+     "Movimientos corporativos y alianzas estratégicas"),
     # Financiero
-    if any(w in tl for w in ["resultado", "ingreso", "beneficio", "ganancias", "earnings", "revenue", "profit", "report", "quarter"]):
-        return "Resultados financieros clave en el foco"
-    
+    (["resultado", "ingreso", "beneficio", "ganancias", "earnings", "revenue", "profit", "report", "quarter"],
+     "Resultados financieros clave en el foco"),
     # Legal/Regulatorio
-    if any(w in tl for w in ["regulación", "multas", "investigación", "lawsuit", "ban", "fine", "antitrust"]):
-        return "Riesgos regulatorios o legales presentes"
-        
+    (["regulación", "multas", "investigación", "lawsuit", "ban", "fine", "antitrust"],
+     "Riesgos regulatorios o legales presentes"),
     # Mercado general
-    if any(w in tl for w in ["fed", "rate", "tasa", "inflación", "inflation", "market", "mercado"]):
-        return "Factores macroeconómicos influyen en el precio"
-        
+    (["fed", "rate", "tasa", "inflación", "inflation", "market", "mercado"],
+     "Factores macroeconómicos influyen en el precio"),
+]
+
+def _reason_mask(text: str) -> int:
+    tl = text.lower()
+    mask = 0
+    for i, (words, _) in enumerate(_REASONS):
+        if any(w in tl for w in words):
+            mask |= 1 << i
+    return mask
+
+@telemetry.timed("sentiment.generate_reason")
+def generate_reason(texts: List[str]) -> str:
+    if not texts:
+        return "Sin noticias relevantes recientes"
+    # La máscara de motivos de cada titular se memoiza igual que su puntaje.
+    keys = {t: "r:" + text_key(t) for t in set(texts)}
+    known = _MEMO.get_many(keys.values())
+    fresh = {keys[t]: float(_reason_mask(t)) for t in keys if keys[t] not in known}
+    _MEMO.put_many(fresh)
+    known.update(fresh)
+    mask = 0
+    for k in keys.values():
+        mask |= int(known[k])
+    for i, (_, reason) in enumerate(_REASONS):
+        if mask & (1 << i):
+            return reason
     return "Narrativa de mercado mixta; monitorear volatilidad"
@@ -1,6 +1,8 @@
 import math
 from typing import List, Dict, Any, Optional
 
+from pybackend.services import telemetry
+
 # -----------------------------------------------------------------------------
 # 1. Representación de Vectores
 # -----------------------------------------------------------------------------
@@ -17,8 +19,8 @@ def extract_features(reco_data: Dict[str, Any]) -> Dict[str, float]:
     Retorna un diccionario con claves: pe, beta, volatility, recent_return, sentiment.
     Los valores None se convierten en 0.0 o un promedio neutro para el cálculo.
     """
-    info = reco_data.get("info", {})
-    metrics = reco_data.get("metrics", {})
+    info = reco_data.get("info") or {}
+    metrics = reco_data.get("metrics") or {}
     
     # Extracción con valores por defecto seguros
     pe = info.get("trailingPE")
@@ -88,9 +90,306 @@ def manhattan_distance(v1: Dict[str, float], v2: Dict[str, float]) -> float:
     return distance
 
 # -----------------------------------------------------------------------------
-# 3. Implementación del Algoritmo k-NN
+# 3. Índice vectorizado (NumPy) y algoritmo k-NN
 # -----------------------------------------------------------------------------
 
+FEATURES = ["pe", "beta", "volatility", "recent_return", "sentiment"]
+
+# Máximo de celdas (consultas × pool) de la matriz de distancias por bloque.
+_BLOCK_CELLS = 4_000_000
+
+def _np():
+    import numpy as np
+    return np
+
+class SimilarityIndex:
+    """
+    Guarda una sola vez la matriz de features normalizada (Min-Max) del pool y
+    responde k-NN con distancia Manhattan vectorizada y top-k por argpartition.
+    Las consultas en lote se calculan por bloques para acotar memoria.
+
+    El índice es mutable: `upsert`/`remove` mantienen los rangos por feature y
+    sólo reescalan una columna cuando su rango se mueve. Las listas de vecinos
+    para `k` se guardan por fila y se corrigen de forma incremental con las
+    distancias de la fila que cambió (O(n) por cambio en vez de O(n²)); sólo las
+    filas cuya lista ya no se puede reparar se recalculan, y de forma perezosa.
+    """
+
+    def __init__(self, symbols: List[str], raw, data: List[Dict[str, Any]], k: int = 5):
+        np = _np()
+        raw = np.asarray(raw, dtype=float).reshape(len(symbols), len(FEATURES))
+        n = raw.shape[0]
+        cap = max(16, 2 * n)
+        d = len(FEATURES)
+        self.k = k
+        self._n = n
+        self.symbols = list(symbols)
+        self.data = list(data)
+        self._raw = np.zeros((cap, d))
+        self._raw[:n] = raw
+        self._norm = np.zeros((cap, d))
+        self._pos: Dict[str, int] = {}
+        for i, s in enumerate(self.symbols):
+            self._pos.setdefault(s, i)
+        self._lo = raw.min(axis=0) if n else np.zeros(d)
+        self._hi = raw.max(axis=0) if n else np.zeros(d)
+        self._rescale(range(d))
+        # Vecinos cacheados por fila: índices (-1 = vacío) y distancias, orden ascendente.
+        self._nbr_idx = np.full((cap, k), -1, dtype=np.int64)
+        self._nbr_dist = np.full((cap, k), np.inf)
+        self._dirty = np.ones(cap, dtype=bool)
+
+    @classmethod
+    def from_pool(cls, pool_data: List[Dict[str, Any]], k: int = 5) -> "SimilarityIndex":
+        raw = [[extract_features(item)[f] for f in FEATURES] for item in pool_data]
+        return cls([item["symbol"] for item in pool_data], raw, pool_data, k=k)
+
+    @property
+    def raw(self):
+        return self._raw[:self._n]
+
+    @property
+    def norm(self):
+        return self._norm[:self._n]
+
+    def __len__(self) -> int:
+        return self._n
+
+    # -- Normalización incremental ---------------------------------------------
+
+    def _rescale(self, cols) -> None:
+        n = self._n
+        for j in cols:
+            span = self._hi[j] - self._lo[j]
+            if span == 0:
+                self._norm[:n, j] = 0.5 # Si todos son iguales, valor medio
+            else:
+                self._norm[:n, j] = (self._raw[:n, j] - self._lo[j]) / span
+
+    def _normalize_row(self, i: int) -> None:
+        np = _np()
+        span = self._hi - self._lo
+        safe = np.where(span == 0, 1.0, span)
+        self._norm[i] = np.where(span == 0, 0.5, (self._raw[i] - self._lo) / safe)
+
+    def _refresh_ranges(self, old, new) -> List[int]:
+        """Actualiza min/max tras cambiar un valor `old` -> `new` (None = fila nueva/borrada)."""
+        n = self._n
+        moved: List[int] = []
+        for j in range(len(FEATURES)):
+            lo, hi = self._lo[j], self._hi[j]
+            if n == 0:
+                continue
+            if old is not None and (old[j] == lo or old[j] == hi):
+                # El extremo pudo haberse ido: se recalcula sólo esta columna.
+                col = self._raw[:n, j]
+                self._lo[j], self._hi[j] = col.min(), col.max()
+            if new is not None:
+                self._lo[j] = min(self._lo[j], new[j])
+                self._hi[j] = max(self._hi[j], new[j])
+            if self._lo[j] != lo or self._hi[j] != hi:
+                moved.append(j)
+        return moved
+
+    # -- Mutaciones ----------------------------------------------------------------
+
+    def _grow(self) -> None:
+        np = _np()
+        cap = 2 * self._raw.shape[0]
+        for name, fill in (("_raw", 0.0), ("_norm", 0.0), ("_nbr_dist", np.inf)):
+            buf = getattr(self, name)
+            new = np.full((cap,) + buf.shape[1:], fill)
+            new[:self._n] = buf[:self._n]
+            setattr(self, name, new)
+        idx = np.full((cap, self.k), -1, dtype=np.int64)
+        idx[:self._n] = self._nbr_idx[:self._n]
+        self._nbr_idx = idx
+        dirty = np.ones(cap, dtype=bool)
+        dirty[:self._n] = self._dirty[:self._n]
+        self._dirty = dirty
+
+    def upsert(self, item: Dict[str, Any]) -> None:
+        """Inserta o actualiza un símbolo a partir de su dict de recomendación."""
+        feats = extract_features(item)
+        self.upsert_vector(item["symbol"], [feats[f] for f in FEATURES], item)
+
+    def upsert_vector(self, symbol: str, vector: List[float], data: Optional[Dict[str, Any]] = None) -> None:
+        np = _np()
+        new = np.asarray(vector, dtype=float)
+        i = self._pos.get(symbol)
+        if i is None:
+            if self._n == self._raw.shape[0]:
+                self._grow()
+            i = self._n
+            self._n += 1
+            self.symbols.append(symbol)
+            self.data.append(data if data is not None else {"symbol": symbol})
+            self._pos[symbol] = i
+            self._nbr_idx[i] = -1
+            self._nbr_dist[i] = np.inf
+            old = None
+            if self._n == 1:
+                self._lo, self._hi = new.copy(), new.copy()
+        else:
+            old = self._raw[i].copy()
+            if data is not None:
+                self.data[i] = data
+            if np.array_equal(old, new):
+                return
+        self._raw[i] = new
+        moved = self._refresh_ranges(old, new)
+        if moved:
+            # Cambió la escala de alguna feature: todas las distancias cambian.
+            self._rescale(moved)
+            self._normalize_row(i)
+            self._dirty[:self._n] = True
+            return
+        self._normalize_row(i)
+        self._patch_neighbors(i)
+
+    def remove(self, symbol: str) -> None:
+        np = _np()
+        i = self._pos.pop(symbol, None)
+        if i is None:
+            return
+        last = self._n - 1
+        old = self._raw[i].copy()
+        n = self._n
+        # Quien tenía a i entre sus vecinos necesita un vecino nuevo.
+        self._dirty[:n] |= (self._nbr_idx[:n] == i).any(axis=1)
+        if i != last:
+            # La última fila ocupa el hueco.
+            self._raw[i] = self._raw[last]
+            self._norm[i] = self._norm[last]
+            self._nbr_idx[i] = self._nbr_idx[last]
+            self._nbr_dist[i] = self._nbr_dist[last]
+            self._dirty[i] = self._dirty[last]
+            self.symbols[i] = self.symbols[last]
+            self.data[i] = self.data[last]
+            if self._pos.get(self.symbols[i]) == last:
+                self._pos[self.symbols[i]] = i
+            self._nbr_idx[:n][self._nbr_idx[:n] == last] = i
+        self.symbols.pop()
+        self.data.pop()
+        self._n -= 1
+        self._nbr_idx[last] = -1
+        self._nbr_dist[last] = np.inf
+        self._dirty[last] = True
+        if symbol in self.symbols:
+            self._pos[symbol] = self.symbols.index(symbol)
+        moved = self._refresh_ranges(old, None)
+        if moved:
+            self._rescale(moved)
+            self._dirty[:self._n] = True
+
+    def _patch_neighbors(self, i: int) -> None:
+        """Corrige las listas de vecinos tras mover la fila i sin cambiar la escala."""
+        np = _np()
+        n = self._n
+        d = self._distances(np.array([i]))[0]
+        d[i] = np.inf
+        self._dirty[i] = True
+        idx = self._nbr_idx[:n]
+        dist = self._nbr_dist[:n]
+        valid = ~self._dirty[:n]
+        kth = dist[:, -1]
+        has_i = (idx == i).any(axis=1) & valid
+        # Se alejó más allá del k-ésimo: hace falta buscar un reemplazo.
+        self._dirty[:n] |= has_i & (d > kth)
+        for r in np.flatnonzero(has_i & (d <= kth)):
+            dist[r, idx[r] == i] = d[r]
+            self._sort_row(r)
+        enters = valid & ~has_i & ((d < kth) | ((d == kth) & (i < idx[:, -1])))
+        for r in np.flatnonzero(enters):
+            idx[r, -1] = i
+            dist[r, -1] = d[r]
+            self._sort_row(r)
+
+    def _sort_row(self, r: int) -> None:
+        np = _np()
+        idx = self._nbr_idx[r]
+        dist = self._nbr_dist[r]
+        order = np.lexsort((np.where(idx < 0, np.iinfo(np.int64).max, idx), dist))
+        self._nbr_idx[r] = idx[order]
+        self._nbr_dist[r] = dist[order]
+
+    # -- Consultas --------------------------------------------------------------------
+
+    def _distances(self, rows):
+        np = _np()
+        norm = self.norm
+        q = norm[rows]
+        d = np.zeros((len(rows), norm.shape[0]))
+        for j in range(norm.shape[1]):
+            d += np.abs(q[:, j, None] - norm[None, :, j])
+        return d
+
+    def _topk(self, rows, d, k: int):
+        """Top-k por fila como arrays (índices, distancias), rellenando con -1/inf."""
+        np = _np()
+        n = d.shape[1]
+        d[np.arange(len(rows)), rows] = np.inf  # No compararse consigo mismo
+        idx = np.full((len(rows), k), -1, dtype=np.int64)
+        dist = np.full((len(rows), k), np.inf)
+        kk = min(k, n - 1)
+        if kk <= 0:
+            return idx, dist
+        kth = np.partition(d, kk - 1, axis=1)[:, kk - 1]
+        for r in range(len(rows)):
+            # Candidatos <= k-ésima distancia, desempatando por posición en el pool
+            # (mismo orden que el sort estable original).
+            cand = np.flatnonzero(d[r] <= kth[r])
+            cand = cand[np.lexsort((cand, d[r, cand]))][:kk]
+            idx[r, :len(cand)] = cand
+            dist[r, :len(cand)] = d[r, cand]
+        return idx, dist
+
+    def _result(self, i: int, dist: float) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbols[i],
+            "data": self.data[i],
+            "distance": dist,
+            "features": dict(zip(FEATURES, self._raw[i].tolist())), # Útil para mostrar en UI por qué son similares
+        }
+
+    def _blocks(self, rows):
+        block = max(1, _BLOCK_CELLS // max(1, self._n))
+        for start in range(0, len(rows), block):
+            yield rows[start:start + block]
+
+    def query(self, symbol: str, k: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self.query_many([symbol], k).get(symbol, [])
+
+    def query_many(self, symbols: List[str], k: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+        np = _np()
+        k = self.k if k is None else k
+        found = [s for s in dict.fromkeys(symbols) if s in self._pos]
+        if not found:
+            return {}
+        rows_all = np.array([self._pos[s] for s in found], dtype=np.int64)
+        if k == self.k:
+            # Sólo se recalculan las filas cuya lista cacheada no es válida.
+            stale = rows_all[self._dirty[rows_all]]
+            for rows in self._blocks(stale):
+                idx, dist = self._topk(rows, self._distances(rows), k)
+                self._nbr_idx[rows] = idx
+                self._nbr_dist[rows] = dist
+                self._dirty[rows] = False
+            idx, dist = self._nbr_idx[rows_all], self._nbr_dist[rows_all]
+        else:
+            parts = [self._topk(rows, self._distances(rows), k) for rows in self._blocks(rows_all)]
+            idx = np.vstack([p[0] for p in parts])
+            dist = np.vstack([p[1] for p in parts])
+        return {
+            s: [self._result(int(i), float(dd)) for i, dd in zip(idx[r], dist[r]) if i >= 0]
+            for r, s in enumerate(found)
+        }
+
+    def all_pairs(self, k: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Vecinos de todos los símbolos del pool en una sola llamada."""
+        return self.query_many(self.symbols, k)
+
+@telemetry.timed("similarity.find_similar_stocks")
 def find_similar_stocks(
     target_symbol: str, 
     pool_data: List[Dict[str, Any]], 
@@ -107,51 +406,4 @@ def find_similar_stocks(
     Returns:
         Lista de los k diccionarios de recomendación más cercanos, con un campo extra 'distance'.
     """
-    # 1. Identificar target y pool
-    target_data = next((x for x in pool_data if x["symbol"] == target_symbol), None)
-    if not target_data:
-        return [] # Target no encontrado en el pool
-        
-    # 2. Construir vectores crudos
-    # Mapeamos índice -> vector para poder recuperar la data original luego
-    raw_vectors = []
-    indexed_data = []
-    
-    for item in pool_data:
-        vec = extract_features(item)
-        raw_vectors.append(vec)
-        indexed_data.append(item)
-        
-    # 3. Normalizar vectores (CRÍTICO para que PE no domine sobre Sentiment)
-    norm_vectors = normalize_vectors(raw_vectors)
-    
-    # 4. Encontrar el vector normalizado del target
-    # Como el orden se preserva, buscamos el índice del target en pool_data
-    target_idx = -1
-    for i, item in enumerate(pool_data):
-        if item["symbol"] == target_symbol:
-            target_idx = i
-            break
-            
-    if target_idx == -1:
-        return []
-        
-    target_vector_norm = norm_vectors[target_idx]
-    
-    # 5. Calcular distancias
-    distances = []
-    for i, vec_norm in enumerate(norm_vectors):
-        if i == target_idx:
-            continue # No compararse consigo mismo
-            
-        dist = manhattan_distance(target_vector_norm, vec_norm)
-        distances.append({
-            "symbol": indexed_data[i]["symbol"],
-            "data": indexed_data[i],
-            "distance": dist,
-            "features": raw_vectors[i] # Útil para mostrar en UI por qué son similares
-        })
-        
-    # 6. Ordenar y retornar Top K
-    distances.sort(key=lambda x: x["distance"])
-    return distances[:k]
+    return SimilarityIndex.from_pool(pool_data, k=k).query(target_symbol)
@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import inspect
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# -----------------------------------------------------------------------------
+# Deduplicación de llamadas en vuelo ("single flight"): mientras una clave se
+# está descargando, los siguientes llamadores esperan el resultado del primero
+# en vez de repetir la llamada upstream. Hilos y corrutinas comparten el mismo
+# registro, así que un request async puede esperar a uno síncrono y viceversa.
+# -----------------------------------------------------------------------------
+
+# Revalidaciones en segundo plano (stale-while-revalidate), compartidas por
+# todos los registros.
+_BACKGROUND = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("TIKPRED_REVALIDATE_WORKERS", "8")),
+    thread_name_prefix="revalidate",
+)
+
+# Referencias fuertes a las tasks líderes de do_async mientras corren (el loop
+# sólo guarda referencias débiles).
+_TASKS: set = set()
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                return fut, False
+            fut = Future()
+            self._calls[key] = fut
+            return fut, True
+
+    def _finish(self, key: Hashable, fut: Future, result: Any = None, exc: BaseException = None) -> None:
+        with self._lock:
+            if self._calls.get(key) is fut:
+                self._calls.pop(key, None)
+        if fut.done():
+            return
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        fut, leader = self._join(key)
+        if not leader:
+            return fut.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, fut, exc=e)
+            raise
+        self._finish(key, fut, result)
+        return result
+
+    def do_background(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> bool:
+        """
+        Lanza `fn` en segundo plano bajo `key` sin esperar el resultado. Si la
+        clave ya está en vuelo no hace nada y retorna False.
+        """
+        if self.in_flight(key):
+            return False
+
+        def run() -> None:
+            try:
+                self.do(key, fn, *args)
+            except Exception as e:
+                print(f"[ERROR] Falló la revalidación de {key}: {e}")
+
+        _BACKGROUND.submit(run)
+        return True
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Variante para asyncio. `fn` puede ser una función de corrutina o una
+        función síncrona; esta última corre en el executor por defecto para no
+        bloquear el event loop.
+        """
+        fut, leader = self._join(key)
+        if not leader:
+            # shield: cancelar a este llamador no debe cancelar el Future
+            # compartido (wrap_future propaga la cancelación hacia adentro).
+            return await asyncio.shield(asyncio.wrap_future(fut))
+        # La llamada corre aparte (hilo del executor o task propia) y cierra la
+        # clave cuando termina, aunque el llamador que la inició se cancele: la
+        # cancelación de un cliente no se propaga a los demás que esperan.
+        if inspect.iscoroutinefunction(fn):
+            work = asyncio.ensure_future(fn(*args, **kwargs))
+            _TASKS.add(work)
+            work.add_done_callback(_TASKS.discard)
+        else:
+            loop = asyncio.get_running_loop()
+            work = loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+        def _done(f: "asyncio.Future") -> None:
+            if f.cancelled():
+                self._finish(key, fut, exc=asyncio.CancelledError())
+            elif f.exception() is not None:
+                self._finish(key, fut, exc=f.exception())
+            else:
+                self._finish(key, fut, f.result())
+
+        work.add_done_callback(_done)
+        return await asyncio.shield(work)
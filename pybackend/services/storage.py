@@ -0,0 +1,205 @@
+import json
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+# Directorio raíz para datos persistentes (precios, memos, modelos).
+_DEFAULT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".data"))
+BASE_DIR = os.environ.get("TIKPRED_DATA_DIR", _DEFAULT_DIR)
+
+def namespace_dir(provider: str) -> str:
+    """
+    Raíz de datos para un proveedor: los datos reales usan BASE_DIR; los de
+    replay, synthetic o record van a BASE_DIR/<proveedor>, así nunca se mezclan
+    barras, memos o modelos de prueba con los del modo live.
+    """
+    return BASE_DIR if provider == "live" else os.path.join(BASE_DIR, provider)
+
+DATA_DIR = namespace_dir(os.environ.get("TIKPRED_DATA_PROVIDER", "live").partition(":")[0].strip().lower() or "live")
+
+def use_namespace(provider: str) -> None:
+    global DATA_DIR
+    DATA_DIR = namespace_dir(provider)
+
+# Número de segmentos por símbolo antes de compactar en uno solo.
+_MAX_SEGMENTS = 16
+
+# _LOCK ordena a los hilos de este proceso; entre procesos (varios workers sobre
+# el mismo .data) cada símbolo tiene además un lock de archivo, ver _symbol_lock.
+_LOCK = threading.Lock()
+
+def lock_file(fh, blocking: bool = True, shared: bool = False) -> bool:
+    """
+    Lock de archivo sobre `fh` (fcntl, o msvcrt en Windows, siempre exclusivo).
+    Dura hasta cerrar `fh`. Sin `blocking` retorna False si otro proceso lo tiene.
+    """
+    try:
+        import fcntl
+        flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+        fcntl.flock(fh.fileno(), flags)
+        return True
+    except ImportError:
+        pass
+    except OSError:
+        return False
+    try:
+        import msvcrt
+        msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        return True
+    except Exception:
+        return False
+
+def _pd():
+    import pandas as pd
+    return pd
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except Exception:
+        pass
+    try:
+        import fastparquet  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+def data_path(*parts: str) -> str:
+    path = os.path.join(DATA_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+def atomic_write(path: str, payload: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(payload)
+    os.replace(tmp, path)
+
+def read_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh) or {}
+    except Exception:
+        return {}
+
+def write_json(path: str, obj: Dict[str, Any]) -> None:
+    atomic_write(path, json.dumps(obj, sort_keys=True).encode("utf-8"))
+
+# -----------------------------------------------------------------------------
+# Almacén de precios OHLCV: un directorio por símbolo con segmentos append-only
+# -----------------------------------------------------------------------------
+
+def _symbol_dir(symbol: str) -> str:
+    return os.path.join(DATA_DIR, "prices", quote(symbol.upper(), safe=""))
+
+def _segments(symbol: str) -> List[str]:
+    d = _symbol_dir(symbol)
+    try:
+        names = sorted(n for n in os.listdir(d) if n.startswith("seg-") and not n.endswith(".tmp"))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(d, n) for n in names]
+
+def _read_segment(path: str):
+    pd = _pd()
+    if path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, index_col=0, parse_dates=True)
+    df.index = pd.to_datetime(df.index)
+    df.index.name = "Date"
+    return df
+
+def _write_segment(symbol: str, df) -> None:
+    d = _symbol_dir(symbol)
+    os.makedirs(d, exist_ok=True)
+    # time_ns mantiene el orden lexicográfico de los segmentos = orden de escritura
+    stem = f"seg-{time.time_ns():020d}-{os.getpid()}"
+    if _parquet_available():
+        path = os.path.join(d, stem + ".parquet")
+        tmp = path + ".tmp"
+        df.to_parquet(tmp)
+    else:
+        path = os.path.join(d, stem + ".csv")
+        tmp = path + ".tmp"
+        df.to_csv(tmp)
+    os.replace(tmp, path)
+
+def _meta_path(symbol: str) -> str:
+    return os.path.join(_symbol_dir(symbol), "meta.json")
+
+@contextmanager
+def _symbol_lock(symbol: str, shared: bool = False):
+    """Lock entre procesos del directorio de un símbolo: compartido para leer, exclusivo para escribir."""
+    d = _symbol_dir(symbol)
+    if shared and not os.path.isdir(d):
+        yield
+        return
+    os.makedirs(d, exist_ok=True)
+    with open(os.path.join(d, ".lock"), "a+") as fh:
+        lock_file(fh, blocking=True, shared=shared)
+        yield
+
+def load_prices(symbol: str) -> Tuple[Optional[Any], Dict[str, Any]]:
+    """
+    Lee todos los segmentos de un símbolo y los combina. Las fechas repetidas
+    se resuelven quedándose con el segmento más reciente (la última barra del día
+    puede reescribirse al refrescar).
+    """
+    with _symbol_lock(symbol, shared=True):
+        return _load_prices(symbol)
+
+def _load_prices(symbol: str) -> Tuple[Optional[Any], Dict[str, Any]]:
+    pd = _pd()
+    meta = read_json(_meta_path(symbol))
+    frames = []
+    for path in _segments(symbol):
+        try:
+            frames.append(_read_segment(path))
+        except Exception as e:
+            print(f"[ERROR] Segmento ilegible {path}: {e}")
+    if not frames:
+        return None, meta
+    df = pd.concat(frames) if len(frames) > 1 else frames[0]
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    return df, meta
+
+def append_prices(symbol: str, df, **meta_updates: Any) -> None:
+    with _LOCK, _symbol_lock(symbol):
+        if df is not None and not df.empty:
+            _write_segment(symbol, df)
+        meta = read_json(_meta_path(symbol))
+        meta.update(meta_updates)
+        write_json(_meta_path(symbol), meta)
+        if len(_segments(symbol)) > _MAX_SEGMENTS:
+            _compact(symbol)
+
+def write_prices(symbol: str, df, **meta: Any) -> None:
+    """Reemplaza por completo la serie almacenada (rebase o ventana más amplia)."""
+    with _LOCK, _symbol_lock(symbol):
+        old = _segments(symbol)
+        _write_segment(symbol, df)
+        for path in old:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        write_json(_meta_path(symbol), meta)
+
+def _compact(symbol: str) -> None:
+    # Requiere _LOCK y el lock exclusivo del símbolo tomados.
+    old = _segments(symbol)
+    df, _ = _load_prices(symbol)
+    if df is None:
+        return
+    _write_segment(symbol, df)
+    for path in old:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
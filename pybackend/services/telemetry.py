@@ -0,0 +1,206 @@
+import bisect
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# -----------------------------------------------------------------------------
+# Instrumentación liviana en proceso: histogramas de duración por span y por
+# host upstream, y contadores con etiquetas. Registrar cuesta un perf_counter y
+# un incremento bajo lock; el texto Prometheus se arma sólo cuando alguien
+# consulta /metrics. TIKPRED_TELEMETRY=0 deja las funciones sin envolver y no
+# registra nada (las cachés y limitadores igual se exponen).
+# -----------------------------------------------------------------------------
+
+ENABLED = os.environ.get("TIKPRED_TELEMETRY", "1") not in ("0", "false", "no")
+
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = _BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+_HISTOGRAMS: Dict[Tuple[str, Labels], Histogram] = {}
+_COUNTERS: Dict[Tuple[str, Labels], float] = {}
+_HELP: Dict[str, str] = {}
+_LOCK = threading.Lock()
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def histogram(name: str, **labels: Any) -> Histogram:
+    key = (name, _labels(labels))
+    h = _HISTOGRAMS.get(key)
+    if h is None:
+        with _LOCK:
+            h = _HISTOGRAMS.setdefault(key, Histogram())
+    return h
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if not ENABLED:
+        return
+    histogram(name, **labels).observe(value)
+
+def inc(name: str, n: float = 1.0, **labels: Any) -> None:
+    if not ENABLED:
+        return
+    key = (name, _labels(labels))
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0.0) + n
+
+def describe(name: str, text: str) -> None:
+    _HELP[name] = text
+
+describe("tikpred_span_seconds", "Duración de funciones de servicio.")
+describe("tikpred_span_errors_total", "Excepciones por función de servicio.")
+describe("tikpred_upstream_seconds", "Duración de llamadas upstream (sin la espera del limitador).")
+describe("tikpred_upstream_wait_seconds", "Espera por un slot del limitador antes de llamar upstream.")
+describe("tikpred_upstream_calls_total", "Llamadas upstream por host y resultado (ok, error, throttled).")
+describe("tikpred_upstream_retries_total", "Reintentos con backoff por host.")
+describe("tikpred_fallbacks_total", "Fuentes alternativas usadas: históricos (yf.download, Stooq) y titulares (fuente vacía, presupuesto agotado).")
+
+# Sólo Exception cuenta como error: CancelledError y GeneratorExit son cortes por
+# deadline o desconexión del cliente, no fallas del servicio. La duración se
+# registra igual en todos los casos.
+
+@contextmanager
+def span(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("tikpred_span_errors_total", span=name)
+        raise
+    finally:
+        observe("tikpred_span_seconds", time.perf_counter() - t0, span=name)
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorador: registra duración y excepciones de la función (sync o async) como span `name`."""
+    def wrap(fn: Callable) -> Callable:
+        if not ENABLED:
+            return fn
+        h = histogram("tikpred_span_seconds", span=name)
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    inc("tikpred_span_errors_total", span=name)
+                    raise
+                finally:
+                    h.observe(time.perf_counter() - t0)
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                inc("tikpred_span_errors_total", span=name)
+                raise
+            finally:
+                h.observe(time.perf_counter() - t0)
+        return inner
+    return wrap
+
+# -----------------------------------------------------------------------------
+# Exposición en formato de texto Prometheus
+# -----------------------------------------------------------------------------
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+def _header(lines: List[str], name: str, kind: str, seen: set) -> None:
+    if name in seen:
+        return
+    seen.add(name)
+    if name in _HELP:
+        lines.append(f"# HELP {name} {_HELP[name]}")
+    lines.append(f"# TYPE {name} {kind}")
+
+def _gauges() -> List[Tuple[str, str, Labels, float]]:
+    """Métricas leídas al momento del scrape: cachés, limitadores y proveedor."""
+    from pybackend.services import providers, ratelimit
+    from pybackend.services.cache import cache_stats
+    out: List[Tuple[str, str, Labels, float]] = []
+    for cache, st in cache_stats().items():
+        lab = _labels({"cache": cache})
+        for field in ("hits", "misses", "stale_hits", "evictions", "expirations"):
+            out.append((f"tikpred_cache_{field}_total", "counter", lab, st.get(field, 0.0)))
+        out.append(("tikpred_cache_entries", "gauge", lab, st["size"]))
+        out.append(("tikpred_cache_weight", "gauge", lab, st["weight"]))
+    for host, lim in ratelimit.limiters().items():
+        lab = _labels({"host": host})
+        for field, v in lim.snapshot().items():
+            out.append((f"tikpred_limiter_{field}", "gauge", lab, v))
+    prov = providers.active_provider()
+    if prov is not None:
+        for kind, n in list(prov.calls.items()):
+            out.append(("tikpred_provider_calls_total", "counter", _labels({"provider": prov.name, "kind": kind}), float(n)))
+    return out
+
+def render() -> str:
+    lines: List[str] = []
+    seen: set = set()
+    with _LOCK:
+        counters = sorted(_COUNTERS.items())
+        hists = sorted(_HISTOGRAMS.items(), key=lambda kv: kv[0])
+    for (name, labels), v in counters:
+        _header(lines, name, "counter", seen)
+        lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+    for (name, labels), h in hists:
+        counts, total, n = h.snapshot()
+        if n == 0:
+            continue
+        _header(lines, name, "histogram", seen)
+        acc = 0
+        for bound, c in zip(h.buckets + (float("inf"),), counts):
+            acc += c
+            lines.append(f"{name}_bucket{_fmt_labels(labels, ('le', _fmt_value(bound)))} {acc}")
+        lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(total)}")
+        lines.append(f"{name}_count{_fmt_labels(labels)} {n}")
+    try:
+        # Las muestras de una misma métrica deben quedar contiguas.
+        for name, kind, labels, v in sorted(_gauges(), key=lambda g: g[0]):
+            _header(lines, name, kind, seen)
+            lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+    except Exception as e:
+        print(f"[ERROR] No se pudieron leer las métricas de cachés/limitadores: {e}")
+    return "\n".join(lines) + "\n"
+
+def reset() -> None:
+    with _LOCK:
+        _HISTOGRAMS.clear()
+        _COUNTERS.clear()
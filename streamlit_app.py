@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from pybackend.services.finance import compute_metrics_bulk, get_historical, get_ticker_info
-from pybackend.services.ml import aplicar_kmeans, forecast_next_price
+from pybackend.services.ml import forecast_next_price
+from pybackend.services.models import cluster
 from pybackend.services.sentiment import fetch_headlines, sentiment_score, generate_reason
 import time
 import logging
@@ -10,9 +11,12 @@ _log = logging.getLogger("yfinance")
 _log.setLevel(logging.CRITICAL)
 _log.propagate = False
 from pybackend.services.catalog import CATEGORIES, get_symbols_by_category
-from pybackend.services.recommender import recommend_for_symbol, recommend_similar_stocks
+from pybackend.services import prewarm
+from pybackend.services.recommender import recommend_many, recommend_similar_stocks
 
 st.set_page_config(page_title="Stock Advisor BI", layout="wide")
+# Una sola vez por proceso; mantiene calientes las cachés entre usuarios.
+prewarm.start()
 st.title("Stock Advisor BI")
 st.subheader("Selección por Categoría")
 category = st.selectbox("Categoría", list(CATEGORIES.keys()), index=0)
@@ -43,9 +47,26 @@ def cached_headlines(sym):
 def cached_sent(texts):
     return sentiment_score(texts)
 
+class _IncompleteRecos(Exception):
+    def __init__(self, recos):
+        super().__init__("recomendaciones con campos vencidos")
+        self.recos = recos
+
 @st.cache_data(ttl=900)
-def cached_reco(sym):
-    return recommend_for_symbol(sym)
+def _complete_recos(syms):
+    recos = {r["symbol"]: r for r in recommend_many(list(syms))}
+    # Una excepción no se cachea: un lote con timeouts se vuelve a pedir en la
+    # próxima interacción en vez de congelar los null por 15 minutos.
+    if any(r.get("timedOut") for r in recos.values()):
+        raise _IncompleteRecos(recos)
+    return recos
+
+def cached_recos(syms):
+    # Una sola llamada por lote de símbolos (tupla para que sea hasheable).
+    try:
+        return _complete_recos(syms)
+    except _IncompleteRecos as e:
+        return e.recos
 
 if "prefs" not in st.session_state:
     st.session_state["prefs"] = {}
@@ -61,7 +82,7 @@ if st.session_state["analyzed"]:
     df = pd.DataFrame(metrics)
     st.subheader("Métricas")
     st.dataframe(df)
-    clusters = aplicar_kmeans(metrics, n_clusters=3)
+    clusters = cluster(metrics, n_clusters=3)
     cldf = pd.DataFrame(clusters)
     st.subheader("Clustering K-Means")
     st.dataframe(cldf)
@@ -98,7 +119,7 @@ if st.session_state["analyzed"]:
                 "tipo": group or "Mixto",
                 "sentimiento": sent,
             })
-            reco = cached_reco(sym)
+            reco = cached_recos(tuple(symbols))[sym]
             conf_val = reco.get("confidence")
             conf_str = f"{conf_val:.1%}" if conf_val is not None else "N/A"
             st.write({
@@ -123,7 +144,7 @@ if st.session_state["analyzed"]:
                 if st.button("Confirmar Voto", key=f"btn_conf_{sym}"):
                     # Lógica de validación (Cross-Check)
                     curr_group = group if group else "Mixto"
-                    curr_dir = reco.get("direction", "Neutral")
+                    curr_dir = reco.get("direction") or "Neutral"
                     curr_sent = reco.get("sentiment") or 0.0
                     
                     valid = True
@@ -194,9 +215,8 @@ if st.session_state["analyzed"]:
         st.caption("Basado en proximidad Manhattan (PE, Beta, Volatilidad, Retorno, Sentimiento)")
         
         # Recolectar datos de todo el pool visible para comparar
-        pool_data = []
-        for s in symbols:
-            pool_data.append(cached_reco(s))
+        recos = cached_recos(tuple(symbols))
+        pool_data = [recos[s] for s in symbols]
             
         similar_stocks = recommend_similar_stocks(sel, pool_data, k=4)
         
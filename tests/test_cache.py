@@ -0,0 +1,64 @@
+import types
+
+import pytest
+
+from pybackend.services import cache
+from pybackend.services.cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_their_ttl(clock):
+    c = TTLCache("test_cache_ttl", ttl=10, negative_ttl=2)
+    c.set("a", 1)
+    clock[0] += 9
+    assert c.get("a") == 1
+    clock[0] += 2
+    assert c.get("a") is None
+    assert c.stats()["expirations"] == 1
+
+
+def test_failures_use_the_negative_ttl(clock):
+    c = TTLCache("test_cache_negative", ttl=10, negative_ttl=2)
+    c.set("bad", None, ok=False)
+    c.set("off", "x", ok=False)
+    assert c.get("off") == "x"
+    clock[0] += 3
+    assert c.get("off") is None
+    zero = TTLCache("test_cache_negative_zero", ttl=10, negative_ttl=0)
+    zero.set("bad", "x", ok=False)
+    assert len(zero) == 0
+
+
+def test_stale_window_serves_only_successes(clock):
+    c = TTLCache("test_cache_stale", ttl=10, negative_ttl=10, stale_ttl=5)
+    c.set("good", 1)
+    c.set("bad", 2, ok=False)
+    clock[0] += 12
+    assert c.get("good") is None
+    assert c.get_stale("good") == (1, True)
+    assert c.get_stale("bad") == (None, False)
+    clock[0] += 5
+    assert c.get_stale("good") == (None, False)
+
+
+def test_lru_eviction_by_size_and_weight(clock):
+    c = TTLCache("test_cache_lru", maxsize=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert (c.get("a"), c.get("c")) == (1, 3)
+    w = TTLCache("test_cache_weight", maxsize=10, max_weight=10, weigher=len)
+    w.set("a", "xxxx")
+    w.set("b", "yyyy")
+    w.set("c", "zzzz")
+    assert w.get("a") is None
+    assert w.stats()["weight"] == 8
+    assert w.stats()["evictions"] == 1
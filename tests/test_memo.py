@@ -0,0 +1,25 @@
+from pybackend.services import sentiment
+from pybackend.services.memo import ContentMemo, text_key
+
+
+def test_text_key_collapses_whitespace_only():
+    assert text_key("  Apple   beats\nestimates ") == text_key("Apple beats estimates")
+    assert text_key("Apple stock is GOOD") != text_key("apple stock is good")
+
+
+def test_memo_round_trip(tmp_path):
+    memo = ContentMemo("test_memo_rt", path=str(tmp_path / "memo.sqlite"))
+    memo.put_many({"a": 1.0, "b": -0.5})
+    assert memo.get_many(["a", "b", "c"]) == {"a": 1.0, "b": -0.5}
+    fresh = ContentMemo("test_memo_rt2", path=str(tmp_path / "memo.sqlite"))
+    assert fresh.get_many(["a", "b"]) == {"a": 1.0, "b": -0.5}
+
+
+def test_case_distinct_headlines_keep_their_own_score(tmp_path, monkeypatch):
+    monkeypatch.setattr(sentiment, "_MEMO", ContentMemo("test_memo_case", path=str(tmp_path / "memo.sqlite")))
+    engine = sentiment.SentimentEngine()
+    upper, lower = "Apple stock is GOOD", "apple stock is good"
+    first = engine.score_many([upper])[upper]
+    second = engine.score_many([lower])[lower]
+    assert first == engine.score_text(upper)
+    assert second == engine.score_text(lower)
@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pybackend.services.metrics import compute_metrics_frames
+
+
+def _old_metrics(symbol, df):
+    # Fórmula original de finance.compute_metrics, símbolo por símbolo con pandas.
+    closes = df["Close"].astype(float)
+    rets = closes.pct_change().dropna()
+    last30 = rets.tail(30)
+    volatility = float(last30.std()) if len(last30) > 0 else float(rets.std()) if len(rets) else None
+    returns_mean = float(rets.mean()) if len(rets) else None
+    volume_avg = float(df["Volume"].astype(float).tail(60).mean()) if len(df) else None
+    clean = lambda x: None if x is None or math.isnan(x) else x
+    return {"symbol": symbol, "returns": clean(returns_mean), "volatility": clean(volatility), "volume_avg": clean(volume_avg)}
+
+
+def _frame(rng, dates):
+    n = len(dates)
+    close = 100.0 * np.cumprod(1.0 + rng.normal(0, 0.02, n))
+    return pd.DataFrame({"Close": close, "Volume": rng.uniform(1e5, 1e6, n)}, index=pd.DatetimeIndex(dates, name="Date"))
+
+
+def test_frames_match_the_pandas_formula_on_ragged_calendars():
+    rng = np.random.default_rng(7)
+    days = pd.bdate_range("2024-01-01", periods=60)
+    frames = {
+        "FULL": _frame(rng, days),
+        # Feriados locales: faltan fechas sueltas en el medio.
+        "HOLES": _frame(rng, days.delete([3, 17, 18, 40])),
+        # Listado reciente: sólo las últimas 12 barras.
+        "NEW": _frame(rng, days[-12:]),
+        # Calendario corrido: sin dato en las últimas barras y con fines de semana.
+        "SHIFT": _frame(rng, pd.date_range("2023-12-20", periods=55, freq="D")),
+        "ONE": _frame(rng, days[-1:]),
+    }
+    symbols = list(frames) + ["NONE"]
+    got = {m["symbol"]: m for m in compute_metrics_frames(symbols, frames)}
+    for s, df in frames.items():
+        want = _old_metrics(s, df)
+        for field in ("returns", "volatility", "volume_avg"):
+            if want[field] is None:
+                assert got[s][field] is None, (s, field)
+            else:
+                assert got[s][field] == pytest.approx(want[field], rel=1e-9), (s, field)
+    assert got["NONE"] == {"symbol": "NONE", "returns": None, "volatility": None, "volume_avg": None}
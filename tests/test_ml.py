@@ -0,0 +1,41 @@
+import math
+
+import numpy as np
+import pytest
+
+from pybackend.services.ml import forecast_batch, forecast_next_price
+
+
+def test_forecast_batch_matches_a_plain_line():
+    closes = [2.0 * i + 1.0 for i in range(20)]
+    assert forecast_batch([closes])[0] == pytest.approx(41.0)
+    assert forecast_next_price(closes) == pytest.approx(41.0)
+
+
+def test_forecast_batch_keeps_real_positions_across_gaps():
+    # y = 2x + 1 con un hueco en el medio: el ajuste usa los índices reales y
+    # proyecta en x = len(series), no en la cantidad de puntos válidos.
+    closes = [2.0 * i + 1.0 for i in range(20)]
+    for i in (5, 6, 7, 11):
+        closes[i] = math.nan
+    assert forecast_batch([closes])[0] == pytest.approx(41.0)
+
+
+def test_forecast_batch_ignores_trailing_padding():
+    short = [3.0 * i for i in range(12)]
+    gapped = [3.0 * i for i in range(15)]
+    gapped[4] = math.nan
+    Y = np.full((2, 15), np.nan)
+    Y[0, :12] = short
+    Y[1, :] = gapped
+    preds = forecast_batch(Y)
+    assert preds[0] == pytest.approx(36.0)
+    assert preds[1] == pytest.approx(45.0)
+    assert forecast_batch([short, gapped]) == pytest.approx(preds)
+
+
+def test_forecast_batch_needs_enough_points():
+    closes = [float(i) for i in range(15)]
+    for i in range(2, 10):
+        closes[i] = math.nan
+    assert forecast_batch([closes, []]) == [None, None]
@@ -0,0 +1,58 @@
+import pytest
+
+from pybackend.services.ratelimit import HostLimiter
+
+
+def _limiter(**kw):
+    args = dict(rate=2.0, max_rate=4.0, concurrency=2.0, max_concurrency=4)
+    args.update(kw)
+    return HostLimiter("test", **args)
+
+
+def test_success_raises_rate_and_concurrency_up_to_their_caps():
+    lim = _limiter(rate=20.0, max_rate=21.0)
+    for _ in range(25):
+        lim.acquire()
+        lim.release(ok=True)
+    snap = lim.snapshot()
+    assert snap["rate"] == pytest.approx(21.0)
+    assert snap["concurrency"] == pytest.approx(4.0)
+    assert snap["in_flight"] == 0
+
+
+def test_errors_shrink_and_throttling_halves_and_blocks():
+    lim = _limiter()
+    lim.acquire()
+    lim.release(ok=False)
+    assert lim.snapshot()["rate"] == pytest.approx(1.6)
+    assert lim.snapshot()["blocked_for"] == 0
+    lim.acquire()
+    lim.release(ok=False, throttled=True)
+    snap = lim.snapshot()
+    assert snap["rate"] == pytest.approx(0.8)
+    assert snap["concurrency"] == pytest.approx(1.0)
+    assert snap["blocked_for"] > 1.0
+    ok, wait = lim._try_acquire()
+    assert not ok and wait > 1.0
+
+
+def test_concurrency_limit_caps_in_flight_calls():
+    lim = _limiter(rate=10.0, concurrency=1.0)
+    lim.acquire()
+    ok, wait = lim._try_acquire()
+    assert not ok and wait is None
+    lim.release()
+    assert lim._try_acquire()[0]
+
+
+def test_slot_classifies_exceptions_and_empty_answers():
+    lim = _limiter()
+    with pytest.raises(RuntimeError):
+        with lim.slot():
+            raise RuntimeError("HTTP Error 429: Too Many Requests")
+    assert lim.snapshot()["blocked_for"] > 0
+    assert lim.snapshot()["in_flight"] == 0
+    lim = _limiter()
+    with lim.slot() as slot:
+        slot.fail()
+    assert lim.snapshot()["rate"] == pytest.approx(1.6)
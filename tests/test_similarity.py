@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from pybackend.services.similarity import (
+    SimilarityIndex,
+    extract_features,
+    find_similar_stocks,
+    manhattan_distance,
+    normalize_vectors,
+)
+
+
+def _item(rng, symbol):
+    return {
+        "symbol": symbol,
+        "info": {"trailingPE": float(rng.uniform(5, 60)), "beta": float(rng.uniform(0.3, 2.0))},
+        "metrics": {"returns": float(rng.normal(0, 0.01)), "volatility": float(rng.uniform(0.005, 0.05))},
+        "sentiment": float(rng.uniform(-1, 1)),
+    }
+
+
+def _neighbors(index, k):
+    return {
+        s: [(r["symbol"], pytest.approx(r["distance"], abs=1e-12)) for r in res]
+        for s, res in index.all_pairs(k).items()
+    }
+
+
+def _anchor(symbol, lo):
+    # Fija el mínimo o el máximo de cada feature para que los cambios internos no muevan la escala.
+    pe, beta, ret, vol, sent = (1.0, 0.1, -0.05, 0.001, -1.0) if lo else (80.0, 3.0, 0.05, 0.1, 1.0)
+    return {"symbol": symbol, "info": {"trailingPE": pe, "beta": beta},
+            "metrics": {"returns": ret, "volatility": vol}, "sentiment": sent}
+
+
+def _mutate(index, rng, step):
+    op = rng.integers(3)
+    movable = [s for s in index.symbols if not s.startswith("ANCHOR")]
+    if op == 0:
+        index.upsert(_item(rng, f"N{step}"))
+    elif op == 1 and len(movable) > 5:
+        index.remove(movable[int(rng.integers(len(movable)))])
+    else:
+        index.upsert(_item(rng, movable[int(rng.integers(len(movable)))]))
+
+
+def test_incremental_index_equals_a_rebuild():
+    rng = np.random.default_rng(3)
+    pool = [_anchor("ANCHOR_LO", True), _anchor("ANCHOR_HI", False)] + [_item(rng, f"S{i}") for i in range(40)]
+    index = SimilarityIndex.from_pool(pool, k=4)
+    index.all_pairs()  # llena las listas de vecinos que luego se parchean
+    for step in range(60):
+        _mutate(index, rng, step)
+        rebuilt = SimilarityIndex.from_pool(list(index.data), k=4)
+        assert _neighbors(index, 4) == _neighbors(rebuilt, 4), step
+
+
+def test_incremental_index_survives_scale_changes():
+    rng = np.random.default_rng(4)
+    index = SimilarityIndex.from_pool([_item(rng, f"S{i}") for i in range(30)], k=4)
+    index.all_pairs()
+    index.upsert(_anchor("ANCHOR_HI", False))
+    index.remove("S3")
+    index.upsert(_anchor("S5", True))
+    index.remove("ANCHOR_HI")
+    rebuilt = SimilarityIndex.from_pool(list(index.data), k=4)
+    assert _neighbors(index, 4) == _neighbors(rebuilt, 4)
+
+
+def _reference_knn(target, pool, k):
+    # k-NN original sobre dicts: Min-Max del pool y Manhattan contra cada candidato.
+    vectors = normalize_vectors([extract_features(item) for item in pool])
+    base = vectors[[item["symbol"] for item in pool].index(target)]
+    scored = [
+        (manhattan_distance(base, v), item["symbol"])
+        for item, v in zip(pool, vectors) if item["symbol"] != target
+    ]
+    return sorted(scored, key=lambda x: x[0])[:k]
+
+
+def test_index_matches_the_dict_based_knn():
+    rng = np.random.default_rng(5)
+    pool = [_item(rng, f"S{i}") for i in range(25)]
+    for s in ("S0", "S7", "S24"):
+        want = _reference_knn(s, pool, 3)
+        got = find_similar_stocks(s, pool, 3)
+        assert [r["symbol"] for r in got] == [w[1] for w in want]
+        assert [r["distance"] for r in got] == pytest.approx([w[0] for w in want])
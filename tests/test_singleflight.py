@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pybackend.services.singleflight import SingleFlight
+
+
+def _followers(sf, key, fn, n):
+    return [asyncio.ensure_future(sf.do_async(key, fn)) for _ in range(n)]
+
+
+@pytest.mark.parametrize("kind", ["coroutine", "sync"])
+def test_cancelled_follower_does_not_cancel_the_others(kind):
+    calls = []
+
+    async def slow_async():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    def slow_sync():
+        calls.append(1)
+        time.sleep(0.05)
+        return "ok"
+
+    fn = slow_async if kind == "coroutine" else slow_sync
+
+    async def main():
+        sf = SingleFlight()
+        leader = asyncio.ensure_future(sf.do_async("k", fn))
+        await asyncio.sleep(0)
+        tasks = _followers(sf, "k", fn, 3)
+        await asyncio.sleep(0.01)
+        tasks[0].cancel()
+        results = await asyncio.gather(leader, *tasks[1:])
+        with pytest.raises(asyncio.CancelledError):
+            await tasks[0]
+        return results, sf.in_flight("k")
+
+    results, in_flight = asyncio.run(main())
+    assert results == ["ok"] * 3
+    assert calls == [1]
+    assert not in_flight
+
+
+def test_cancelled_coroutine_leader_still_serves_followers():
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        sf = SingleFlight()
+        leader = asyncio.ensure_future(sf.do_async("k", slow))
+        await asyncio.sleep(0)
+        followers = _followers(sf, "k", slow, 2)
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(main()) == [42, 42]
+
+
+def test_sync_leader_unaffected_by_cancelled_async_follower():
+    sf = SingleFlight()
+    started = threading.Event()
+    out = {}
+
+    def slow():
+        started.set()
+        time.sleep(0.1)
+        return "sync"
+
+    def leader():
+        try:
+            out["result"] = sf.do("k", slow)
+        except BaseException as e:
+            out["error"] = e
+
+    t = threading.Thread(target=leader)
+    t.start()
+    started.wait()
+
+    async def main():
+        follower = asyncio.ensure_future(sf.do_async("k", slow))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+    asyncio.run(main())
+    t.join()
+    assert out == {"result": "sync"}
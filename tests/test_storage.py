@@ -0,0 +1,53 @@
+import pandas as pd
+import pytest
+
+from pybackend.services import storage
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _bars(start, n, close=1.0):
+    idx = pd.date_range(start, periods=n, freq="D", name="Date")
+    return pd.DataFrame({"Close": [close + i for i in range(n)], "Volume": [100.0] * n}, index=idx)
+
+
+def test_append_merges_segments_and_keeps_the_latest_bar():
+    storage.append_prices("AAPL", _bars("2024-01-01", 5), fetched_at=1.0)
+    storage.append_prices("AAPL", _bars("2024-01-05", 3, close=50.0), fetched_at=2.0)
+    df, meta = storage.load_prices("aapl")
+    assert len(df) == 7
+    assert df.index.is_monotonic_increasing
+    assert df.loc["2024-01-05", "Close"] == 50.0
+    assert meta["fetched_at"] == 2.0
+
+
+def test_meta_only_append_keeps_the_bars():
+    storage.append_prices("MSFT", _bars("2024-01-01", 3), fetched_at=1.0)
+    storage.append_prices("MSFT", None, period="70d")
+    df, meta = storage.load_prices("MSFT")
+    assert len(df) == 3
+    assert meta == {"fetched_at": 1.0, "period": "70d"}
+
+
+def test_compaction_rewrites_one_segment_with_the_same_series(monkeypatch):
+    monkeypatch.setattr(storage, "_MAX_SEGMENTS", 3)
+    for i in range(4):
+        storage.append_prices("NVDA", _bars("2024-01-01", 2 + i, close=10.0 * i))
+    assert len(storage._segments("NVDA")) == 1
+    df, _ = storage.load_prices("NVDA")
+    assert len(df) == 5
+    assert df["Close"].tolist() == [30.0, 31.0, 32.0, 33.0, 34.0]
+
+
+def test_write_prices_replaces_the_series():
+    storage.append_prices("META", _bars("2024-01-01", 5))
+    storage.write_prices("META", _bars("2024-02-01", 2), period="1y")
+    df, meta = storage.load_prices("META")
+    assert df.index[0] == pd.Timestamp("2024-02-01")
+    assert len(df) == 2
+    assert meta == {"period": "1y"}
+    assert storage.load_prices("GOOG") == (None, {})